@@ -1,10 +1,27 @@
+import os
 from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime
-from app.models.preview_model import PreviewResponse
-from app.services.preview_service import generate_prediction
+from app.models.preview_model import PreviewResponse, PreviewBatchRequest, PreviewBatchResponse, InferenceMetrics
+from app.services.inference_scheduler import QueueFullError
+from app.services.service_loader import preview_loader, ServiceNotReady
 
 router = APIRouter()
 
+MAX_BATCH_DATES = int(os.getenv("PREVIEW_MAX_BATCH", "64"))
+
+def _to_model_date(date: str) -> str:
+    try:
+        dt = datetime.strptime(date, "%d/%m/%Y")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {date}. Use DD/MM/YYYY.")
+    return dt.strftime("%d %m %Y")
+
+def _service():
+    try:
+        return preview_loader.get()
+    except ServiceNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
 @router.get("/preview", response_model=PreviewResponse)
 def preview(date: str = Query(..., description="Date in format DD/MM/YYYY")):
     try:
@@ -13,5 +30,31 @@ def preview(date: str = Query(..., description="Date in format DD/MM/YYYY")):
         raise HTTPException(status_code=400, detail="Invalid date format. Use DD/MM/YYYY.")
 
     date_str = dt.strftime("%d %m %Y")
-    numbers = generate_prediction(date_str)
+    try:
+        numbers = _service().generate_prediction(date_str)
+    except (QueueFullError, ServiceNotReady) as e:
+        raise HTTPException(status_code=503, detail=str(e))
     return PreviewResponse(date=date, numbers=numbers)
+
+@router.post("/preview/batch", response_model=PreviewBatchResponse)
+def preview_batch(request: PreviewBatchRequest):
+    """Predict several dates at once: past dates from history, future ones batched by the scheduler"""
+    if not request.dates:
+        raise HTTPException(status_code=400, detail="No dates given.")
+    if len(request.dates) > MAX_BATCH_DATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_DATES} dates per request.")
+
+    date_strs = [_to_model_date(date) for date in request.dates]
+    try:
+        predictions = _service().generate_predictions(date_strs)
+    except (QueueFullError, ServiceNotReady) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return PreviewBatchResponse(
+        results=[PreviewResponse(date=date, numbers=numbers) for date, numbers in zip(request.dates, predictions)]
+    )
+
+
+@router.get("/preview/metrics", response_model=InferenceMetrics)
+def preview_metrics():
+    """Inference scheduler configuration and counters"""
+    return InferenceMetrics(**_service().metrics())
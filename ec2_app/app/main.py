@@ -1,6 +1,8 @@
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from threading import Thread
 
 # Load variables from .env
@@ -8,13 +10,29 @@ load_dotenv()
 
 from app.controllers import preview_controller, train_controller
 from app.workers.train_worker import start_worker  # Just import the function, without loops
+from app.services.service_loader import preview_loader
+from app.services.train_executor import training_executor
 
-app = FastAPI(title="Lottery Numbers Prediction")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only with TRAIN_CPUS set; before torch is imported so inference threads stay off them
+    training_executor.reserve_api_cpus()
+    # Model load and warm-up run in the background; /ready reports when they are done
+    preview_loader.start()
+    yield
+
+app = FastAPI(title="Lottery Numbers Prediction", lifespan=lifespan)
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+def readiness_check():
+    """503 until the model is loaded and warmed up, with the time each startup phase took"""
+    status = preview_loader.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 # Include API routers
 app.include_router(preview_controller.router)
 app.include_router(train_controller.router)
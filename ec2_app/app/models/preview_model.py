@@ -4,6 +4,35 @@ class PreviewResponse(BaseModel):
     date: str
     numbers: list[int]
 
+class PreviewBatchRequest(BaseModel):
+    dates: list[str]
+
+class PreviewBatchResponse(BaseModel):
+    results: list[PreviewResponse]
+
+class InferenceMetrics(BaseModel):
+    engine: str | None
+    model_version: str | None
+    max_batch_size: int
+    max_wait_ms: float
+    max_queue: int
+    queue_depth: int
+    requests: int
+    rejected: int
+    batches: int
+    failed_batches: int
+    largest_batch: int
+    avg_batch_size: float
+    last_batch_ms: float
+
 class TrainResponse(BaseModel):
     status: str
-    message: str
\ No newline at end of file
+    message: str
+    job: int | None = None
+    pid: int | None = None
+    cpus: list[int] | None = None
+    threads: int | None = None
+    step: int | None = None
+    max_steps: int | None = None
+    epoch: float | None = None
+    loss: float | None = None
\ No newline at end of file
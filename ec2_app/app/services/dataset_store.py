@@ -0,0 +1,97 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import boto3
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class DatasetStore:
+    """Reads the dataset written by the Lambda from S3.
+
+    With DATASET_LAYOUT=sharded only the manifest is fetched on every load;
+    shards are immutable and cached on disk by hash, so a reader downloads
+    just the shards it has not seen yet (normally only the tail one).
+    """
+
+    def __init__(self, bucket: str, dataset_file: str, region: str, localstack_url: str):
+        self.bucket = bucket
+        self.dataset_file = dataset_file
+        self.layout = os.getenv("DATASET_LAYOUT", "single").lower()
+        self.prefix = os.getenv("DATASET_PREFIX", "dataset/")
+        self.cache_dir = os.getenv("DATASET_CACHE_DIR", "./dataset_cache")
+        self.s3 = boto3.client("s3", endpoint_url=localstack_url, region_name=region)
+
+    def load(self) -> list[dict]:
+        if self.layout == "sharded":
+            return self._load_sharded()
+        return json.loads(self._get_body(self.dataset_file))
+
+    def _load_sharded(self) -> list[dict]:
+        manifest_key = f"{self.prefix}manifest.json"
+        manifest = json.loads(self._get_body(manifest_key))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        records = []
+        downloaded = 0
+        # Newest shard first, matching the single-file order
+        for entry in sorted(manifest["shards"], key=lambda e: e["index"], reverse=True):
+            body = self._read_cached_shard(entry["sha256"])
+            if body is None:
+                body = self._get_body(entry["key"])
+                if hashlib.sha256(body).hexdigest() != entry["sha256"]:
+                    raise ValueError(f"Hash mismatch for shard {entry['key']}")
+                self._write_cached_shard(entry["sha256"], body)
+                downloaded += 1
+            records.extend(json.loads(body))
+
+        self._prune_cache({e["sha256"] for e in manifest["shards"]})
+        logger.info(f"📦 {len(manifest['shards'])} shard(s) loaded, {downloaded} downloaded")
+        return records
+
+    def _get_body(self, key: str) -> bytes:
+        """GET an object, transparently decoding gzip/zstd ContentEncoding"""
+        response = self.s3.get_object(Bucket=self.bucket, Key=key)
+        data = response["Body"].read()
+        encoding = response.get("ContentEncoding")
+        if encoding == "gzip":
+            return gzip.decompress(data)
+        if encoding == "zstd":
+            if zstandard is None:
+                raise RuntimeError(f"{key} is zstd-encoded but the zstandard package is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    def _cache_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _read_cached_shard(self, digest: str) -> bytes | None:
+        path = self._cache_path(digest)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            body = f.read()
+        if hashlib.sha256(body).hexdigest() != digest:
+            return None
+        return body
+
+    def _write_cached_shard(self, digest: str, body: bytes):
+        path = self._cache_path(digest)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def _prune_cache(self, keep: set[str]):
+        """Drop shards superseded by a newer version (the old tail shard)"""
+        for name in os.listdir(self.cache_dir):
+            digest, ext = os.path.splitext(name)
+            if ext == ".json" and digest not in keep:
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,115 @@
+import re
+import bisect
+import logging
+from datetime import date, datetime
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATE_PATTERN = re.compile(r"(\d{1,2})[/\-\s](\d{1,2})[/\-\s](\d{4})")
+NUMBERS_PER_DRAW = 6
+EPOCH = np.datetime64("1970-01-01", "D")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class DrawHistory:
+    """Past Mega-Sena draws in three parallel arrays sorted by date.
+
+    numbers is uint8[N, 6]; ordinals (date.toordinal()) and contests are
+    int32[N] (contest 0 when the record has no "number"). A lookup bisects the
+    ordinals instead of hashing a "dd/mm/yyyy" string, so the whole history is
+    a few contiguous buffers rather than thousands of small Python objects.
+    """
+
+    def __init__(self, ordinals: np.ndarray, numbers: np.ndarray, contests: np.ndarray):
+        order = np.argsort(ordinals, kind="stable")
+        self.ordinals = np.ascontiguousarray(ordinals[order], dtype=np.int32)
+        self.numbers = np.ascontiguousarray(numbers[order], dtype=np.uint8)
+        self.contests = np.ascontiguousarray(contests[order], dtype=np.int32)
+        # bisect over a memoryview compares plain ints, much cheaper than NumPy scalars
+        self._ordinals_view = memoryview(self.ordinals)
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "DrawHistory":
+        """Build from dataset records ({"prompt": "Digits: dd mm yyyy -> Numbers:", "completion": " a b c d e f"}).
+
+        The dates of all prompts come from one regex pass over the joined text
+        and the numbers from one array conversion. That only holds when every
+        record has exactly one date in its prompt and six numbers in its
+        completion; otherwise the records are parsed one by one.
+        """
+        if not records:
+            return cls.empty()
+
+        prompts = [r.get("prompt", "") for r in records]
+        completions = [r.get("completion", "") for r in records]
+        # NUL can't be part of a date, so no match spans two prompts
+        matches = list(DATE_PATTERN.finditer("\0".join(prompts)))
+        prompt_starts = np.cumsum([0] + [len(p) + 1 for p in prompts[:-1]])
+        owners = np.searchsorted(prompt_starts, [m.start() for m in matches], side="right") - 1
+        draw_sizes = np.fromiter((len(c.split()) for c in completions), dtype=np.int64, count=len(records))
+
+        if np.array_equal(owners, np.arange(len(records))) and (draw_sizes == NUMBERS_PER_DRAW).all():
+            try:
+                dmy = np.array([m.groups() for m in matches], dtype=np.int32)
+                numbers = np.array(" ".join(completions).split(), dtype=np.int64).reshape(-1, NUMBERS_PER_DRAW)
+            except ValueError:
+                return cls._from_records_slow(records)
+            ordinals, valid = cls._ordinals_from_dmy(dmy)
+            if valid.all() and ((numbers >= 1) & (numbers <= 60)).all():
+                contests = np.array([r.get("number", 0) for r in records], dtype=np.int32)
+                return cls(ordinals, numbers.astype(np.uint8), contests)
+        return cls._from_records_slow(records)
+
+    @staticmethod
+    def _ordinals_from_dmy(dmy: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """date.toordinal() of [day, month, year] rows, and which rows are real dates"""
+        months = ((dmy[:, 2] - 1970) * 12 + dmy[:, 1] - 1).astype("datetime64[M]")
+        month_start = (months.astype("datetime64[D]") - EPOCH).astype(np.int32)
+        month_length = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int32)
+        valid = (dmy[:, 1] >= 1) & (dmy[:, 1] <= 12) & (dmy[:, 0] >= 1) & (dmy[:, 0] <= month_length)
+        return month_start + dmy[:, 0] - 1 + EPOCH_ORDINAL, valid
+
+    @classmethod
+    def _from_records_slow(cls, records: list[dict]) -> "DrawHistory":
+        ordinals, numbers, contests = [], [], []
+        skipped = 0
+        for record in records:
+            text = f"{record.get('prompt', '')}\n{record.get('completion', '')}"
+            match = DATE_PATTERN.search(text)
+            draw = [int(x) for x in re.findall(r"\b\d+\b", record.get("completion", ""))]
+            if not match or len(draw) != NUMBERS_PER_DRAW or not all(1 <= n <= 60 for n in draw):
+                skipped += 1
+                continue
+            day, month, year = (int(g) for g in match.groups())
+            try:
+                ordinals.append(date(year, month, day).toordinal())
+            except ValueError:
+                skipped += 1
+                continue
+            numbers.append(draw)
+            contests.append(record.get("number", 0))
+        if skipped:
+            logger.warning(f"⚠️ {skipped} dataset record(s) without a date or six numbers were skipped")
+        if not ordinals:
+            return cls.empty()
+        return cls(np.array(ordinals), np.array(numbers), np.array(contests))
+
+    @classmethod
+    def empty(cls) -> "DrawHistory":
+        return cls(np.empty(0, np.int32), np.empty((0, NUMBERS_PER_DRAW), np.uint8), np.empty(0, np.int32))
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ordinals.nbytes + self.numbers.nbytes + self.contests.nbytes
+
+    def lookup(self, value: date | datetime) -> list[int] | None:
+        """Numbers drawn on that date, or None when there was no draw"""
+        ordinal = value.toordinal()
+        i = bisect.bisect_left(self._ordinals_view, ordinal)
+        if i < len(self._ordinals_view) and self._ordinals_view[i] == ordinal:
+            return self.numbers[i].tolist()
+        return None
@@ -0,0 +1,131 @@
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class InferenceScheduler:
+    """Coalesces concurrent prediction requests into batched generate calls.
+
+    Each submit() is one request carrying a list of items (the future dates
+    of a /preview or /preview/batch call) and is never split: a request
+    larger than max_batch_size still runs as one generate_batch call of its
+    own. Requests wait in a queue bounded at max_queue items; a single
+    worker thread flushes as soon as the next request would not fit in
+    max_batch_size items or the oldest one has waited max_wait_ms, runs one
+    generate_batch call and resolves each caller's future with its results.
+    One worker also means one model.generate at a time instead of
+    threadpool workers fighting over the same cores.
+    """
+
+    def __init__(self, generate_batch, max_batch_size: int = 16, max_wait_ms: float = 10, max_queue: int = 256):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue = max_queue
+        self._pending = deque()
+        self._pending_items = 0
+        self._ready = threading.Condition()
+        self._lock = threading.Lock()
+        self._served_items = 0
+        self._stats = {
+            "requests": 0,
+            "rejected": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "largest_batch": 0,
+            "last_batch_ms": 0.0,
+        }
+        self._worker = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, items: list) -> Future:
+        """Queue one request; the future resolves to the results of items, in order.
+
+        Capacity is checked for all items before any is queued, so a rejected
+        request leaves nothing behind to run on the model.
+        """
+        future = Future()
+        with self._ready:
+            if self._pending_items + len(items) > self.max_queue:
+                with self._lock:
+                    self._stats["rejected"] += 1
+                raise QueueFullError(
+                    f"Inference queue is full ({self._pending_items} of {self.max_queue} dates pending)"
+                )
+            self._pending.append((list(items), future))
+            self._pending_items += len(items)
+            self._ready.notify()
+        with self._lock:
+            self._stats["requests"] += 1
+        return future
+
+    def _next_batch(self):
+        with self._ready:
+            while not self._pending:
+                self._ready.wait()
+            batch = [self._pending.popleft()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            while size < self.max_batch_size:
+                if self._pending:
+                    if size + len(self._pending[0][0]) > self.max_batch_size:
+                        break
+                    request = self._pending.popleft()
+                    batch.append(request)
+                    size += len(request[0])
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._ready.wait(remaining)
+            self._pending_items -= size
+        return batch
+
+    def _run(self):
+        while True:
+            self._flush(self._next_batch())
+
+    def _flush(self, batch):
+        items = [item for request_items, _ in batch for item in request_items]
+        started = time.perf_counter()
+        try:
+            results = self.generate_batch(items)
+        except Exception as e:
+            logger.error(f"❌ Batched generation failed ({len(batch)} requests, {len(items)} items): {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            failed = True
+        else:
+            offset = 0
+            for request_items, future in batch:
+                future.set_result(results[offset:offset + len(request_items)])
+                offset += len(request_items)
+            failed = False
+
+        with self._lock:
+            self._served_items += len(items)
+            self._stats["batches"] += 1
+            self._stats["failed_batches"] += int(failed)
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(items))
+            self._stats["last_batch_ms"] = (time.perf_counter() - started) * 1000
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            served = self._served_items
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue": self.max_queue,
+            "queue_depth": self._pending_items,
+            "avg_batch_size": served / stats["batches"] if stats["batches"] else 0.0,
+            **stats,
+        }
@@ -0,0 +1,184 @@
+import os
+import json
+import shutil
+import logging
+import torch
+import transformers
+from transformers import AutoModelForCausalLM
+
+logger = logging.getLogger(__name__)
+
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+# Written by TRAIN_METHOD=lora instead of the full weights
+ADAPTER_CONFIG = "adapter_config.json"
+ADAPTER_FILES = ("adapter_model.safetensors", "adapter_model.bin")
+SIGNATURE_FILE = "source.json"
+
+
+def is_adapter(model_path: str) -> bool:
+    return os.path.exists(os.path.join(model_path, ADAPTER_CONFIG))
+
+
+def load_causal_lm(model_path: str, merge_adapter: bool = True, **kwargs):
+    """The full model in model_path, or its LoRA adapter on the base model it was trained from.
+
+    A merged adapter is folded into the base weights (merge_and_unload) and
+    runs exactly like a fully fine-tuned model; unmerged, every adapted layer
+    adds the low-rank product on each forward.
+    """
+    if not is_adapter(model_path):
+        return AutoModelForCausalLM.from_pretrained(model_path, **kwargs)
+
+    from peft import PeftConfig, PeftModel
+    base_model = PeftConfig.from_pretrained(model_path).base_model_name_or_path
+    model = PeftModel.from_pretrained(AutoModelForCausalLM.from_pretrained(base_model, **kwargs), model_path)
+    logger.info(f"🧩 LoRA adapter from {model_path} on {base_model}{' (merged)' if merge_adapter else ''}")
+    if merge_adapter:
+        model = model.merge_and_unload()
+    return model
+
+
+def _weights_signature(model_path: str) -> dict:
+    """Identifies the fp32 weights (or adapter) a derived model was built from"""
+    for name in WEIGHT_FILES + ADAPTER_FILES:
+        path = os.path.join(model_path, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            return {
+                "weights": name,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                # Pickled/exported models are tied to the library versions that wrote them
+                "torch": torch.__version__,
+                "transformers": transformers.__version__
+            }
+    raise FileNotFoundError(f"No model weights in {model_path}")
+
+
+def _derived_dir(model_path: str, suffix: str) -> str:
+    """Derived models live next to OUTPUT_DIR, outside the Trainer's output"""
+    return f"{model_path.rstrip(os.sep)}-{suffix}"
+
+
+def _is_current(derived_dir: str, model_path: str) -> bool:
+    signature_path = os.path.join(derived_dir, SIGNATURE_FILE)
+    if not os.path.exists(signature_path):
+        return False
+    with open(signature_path, "r", encoding="utf-8") as f:
+        return json.load(f) == _weights_signature(model_path)
+
+
+def _write_signature(derived_dir: str, model_path: str):
+    with open(os.path.join(derived_dir, SIGNATURE_FILE), "w", encoding="utf-8") as f:
+        json.dump(_weights_signature(model_path), f)
+
+
+def load_pytorch(model_path: str, merge_adapter: bool = True):
+    return load_causal_lm(model_path, merge_adapter, device_map="auto")
+
+
+def load_int8(model_path: str, merge_adapter: bool = True):
+    """fp32 model with every nn.Linear dynamically quantized to int8 (CPU only).
+
+    A LoRA adapter is always merged first, quantizing the adapted weights.
+
+    The quantized module is saved in <OUTPUT_DIR>-int8 together with the
+    signature of the weights it came from, so later starts load it directly
+    and a retrained model is quantized again.
+    """
+    cache_dir = _derived_dir(model_path, "int8")
+    cache_path = os.path.join(cache_dir, "model.pt")
+
+    if os.path.exists(cache_path):
+        if _is_current(cache_dir, model_path):
+            model = torch.load(cache_path, weights_only=False)
+            logger.info(f"✅ Quantized model loaded from {cache_path}")
+            return model
+        logger.info("🔄 Quantized model is stale, quantizing again...")
+
+    model = load_causal_lm(model_path, dtype=torch.float32)
+    model.eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        torch.save(model, f"{cache_path}.tmp")
+        os.replace(f"{cache_path}.tmp", cache_path)
+        _write_signature(cache_dir, model_path)
+        logger.info(f"💾 Quantized model saved to {cache_path}")
+    except OSError as e:
+        logger.warning(f"⚠️ Could not cache the quantized model: {e}")
+    return model
+
+
+def export_onnx(model_path: str) -> str:
+    """Export the fine-tuned model with past key values to <OUTPUT_DIR>-onnx.
+
+    Needs optimum[onnxruntime]. The export is written to a temporary directory
+    and swapped in, so a server never sees half an export. A LoRA adapter is
+    merged into its base model and exported from there.
+    """
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    export_dir = _derived_dir(model_path, "onnx")
+    tmp_dir = f"{export_dir}.tmp"
+    merged_dir = f"{export_dir}.merged"
+    logger.info(f"📦 Exporting {model_path} to ONNX...")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    source = model_path
+    if is_adapter(model_path):
+        shutil.rmtree(merged_dir, ignore_errors=True)
+        load_causal_lm(model_path).save_pretrained(merged_dir)
+        source = merged_dir
+    try:
+        model = ORTModelForCausalLM.from_pretrained(source, export=True, use_cache=True)
+        model.save_pretrained(tmp_dir)
+    finally:
+        shutil.rmtree(merged_dir, ignore_errors=True)
+    _write_signature(tmp_dir, model_path)
+
+    if os.path.exists(export_dir):
+        old_dir = f"{export_dir}.old"
+        os.replace(export_dir, old_dir)
+        os.replace(tmp_dir, export_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.replace(tmp_dir, export_dir)
+    logger.info(f"✅ ONNX export saved to {export_dir}")
+    return export_dir
+
+
+def load_onnx(model_path: str, merge_adapter: bool = True):
+    """ONNX Runtime model from export_onnx; generate() drives it like the PyTorch one"""
+    export_dir = _derived_dir(model_path, "onnx")
+    if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+        raise FileNotFoundError(f"No ONNX export in {export_dir}")
+    if not _is_current(export_dir, model_path):
+        raise ValueError(f"ONNX export in {export_dir} is stale, the model was retrained after it")
+
+    from optimum.onnxruntime import ORTModelForCausalLM
+    return ORTModelForCausalLM.from_pretrained(export_dir)
+
+
+BACKENDS = {
+    "pytorch": load_pytorch,
+    "int8": load_int8,
+    "onnx": load_onnx,
+}
+
+
+def load_model(model_path: str, backend: str = "pytorch", merge_adapter: bool = True):
+    """Returns (model, backend actually used); PyTorch stands in for a missing or stale ONNX export.
+
+    merge_adapter only matters to the pytorch backend: int8 and onnx always
+    work from the merged weights.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{backend}'. Use one of: {', '.join(BACKENDS)}")
+    try:
+        return BACKENDS[backend](model_path, merge_adapter), backend
+    except (FileNotFoundError, ValueError, ImportError) as e:
+        if backend != "onnx":
+            raise
+        logger.warning(f"⚠️ ONNX engine unavailable ({e}), falling back to PyTorch")
+        return load_pytorch(model_path, merge_adapter), "pytorch"
@@ -0,0 +1,116 @@
+import os
+import gc
+import json
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime, timezone
+import torch
+from app.services.model_backends import WEIGHT_FILES, ADAPTER_CONFIG, ADAPTER_FILES
+
+logger = logging.getLogger(__name__)
+
+VERSION_FILE = "version.json"
+
+
+def publish_model(staging_dir: str, output_dir: str):
+    """Move a finished save from staging_dir into output_dir file by file.
+
+    os.replace swaps each file atomically and leaves the old inode alive for a
+    server still reading (or mmapping) it. Checkpoints already in output_dir
+    are kept, but full weights or a LoRA adapter left over from a run with
+    the other TRAIN_METHOD are removed. Call write_version afterwards to
+    announce the new model.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    published = set(os.listdir(staging_dir))
+    for name in published:
+        os.replace(os.path.join(staging_dir, name), os.path.join(output_dir, name))
+    for name in set(WEIGHT_FILES + ADAPTER_FILES + (ADAPTER_CONFIG,)) - published:
+        path = os.path.join(output_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def write_version(output_dir: str) -> str:
+    """Mark the model in output_dir as complete; the registry reloads on a new version"""
+    saved_at = datetime.now(timezone.utc)
+    version = saved_at.strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(output_dir, VERSION_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": version, "saved_at": saved_at.isoformat()}, f)
+    os.replace(f"{path}.tmp", path)
+    return version
+
+
+class ModelRegistry:
+    """Holds the model currently served and swaps in new versions of OUTPUT_DIR.
+
+    A watcher thread polls OUTPUT_DIR/version.json (written last by training),
+    loads a new version off the request path with load_fn(version) and swaps
+    the reference in one assignment: requests already running keep the object
+    they picked up, and the old model is freed once the last of them finishes.
+    A model saved without a version file is served as "unversioned".
+    """
+
+    def __init__(self, model_path: str, load_fn, watch_interval: float = 30):
+        self.model_path = model_path
+        self.load_fn = load_fn
+        self.watch_interval = watch_interval
+        self._current = None
+        self._attempted = None
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    @property
+    def current(self):
+        return self._current
+
+    def available_version(self) -> str | None:
+        path = os.path.join(self.model_path, VERSION_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)["version"]
+        except (OSError, ValueError, KeyError):
+            pass
+        if any(os.path.exists(os.path.join(self.model_path, name)) for name in WEIGHT_FILES + ADAPTER_FILES):
+            return "unversioned"
+        return None
+
+    def refresh(self) -> bool:
+        """Load and swap in the version on disk if it is new; True when swapped"""
+        with self._lock:
+            version = self.available_version()
+            if version is None or version == self._attempted:
+                return False
+            self._attempted = version
+
+            logger.info(f"🔄 Loading model version {version}...")
+            try:
+                loaded = self.load_fn(version)
+            except Exception as e:
+                logger.error(f"❌ Could not load model version {version}: {e}")
+                return False
+
+            previous, self._current = self._current, loaded
+            logger.info(f"✅ Serving model version {version}")
+
+        if previous is not None:
+            del previous
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        return True
+
+    def start(self):
+        if self.watch_interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            self.refresh()
@@ -0,0 +1,135 @@
+import re
+import functools
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+DIGITS = "0123456789"
+NUMBER_TOKEN = re.compile(r"^ ?[0-9]{1,2}$")
+
+
+class NumberVocabulary:
+    """Tokens that can take part in a " n1 n2 n3 n4 n5 n6" completion and the
+    rules for extending one, built once per loaded tokenizer.
+
+    A parse state is (numbers, partial, fresh): the distinct numbers already
+    closed by a separator, the digits of the number being written and whether
+    nothing has been generated yet (the only place a lone separator is allowed).
+    Two-digit numbers may carry a leading zero ("05"), as the Caixa API sends them.
+    """
+
+    def __init__(self, tokenizer, count: int = 6, low: int = 1, high: int = 60):
+        self.count = count
+        self.low = low
+        self.high = high
+        self.eos_token_id = tokenizer.eos_token_id
+
+        token_ids = list(range(len(tokenizer)))
+        texts = tokenizer.batch_decode([[i] for i in token_ids], clean_up_tokenization_spaces=False)
+        self.candidates = {
+            token_id: text for token_id, text in zip(token_ids, texts)
+            if text == " " or NUMBER_TOKEN.match(text)
+        }
+        self.initial_state = ((), "", True)
+        self._allowed = functools.lru_cache(maxsize=4096)(self._compute_allowed)
+
+    def _usable(self, digits: str, numbers: tuple) -> bool:
+        value = int(digits)
+        return self.low <= value <= self.high and value not in numbers
+
+    def _closes(self, partial: str, numbers: tuple) -> bool:
+        """partial is a number on its own (a lone "0" only opens "0n")"""
+        return 0 < len(partial) <= 2 and partial != "0" and self._usable(partial, numbers)
+
+    def _extends(self, partial: str, numbers: tuple) -> bool:
+        return len(partial) == 1 and any(self._usable(partial + d, numbers) for d in DIGITS)
+
+    def advance(self, state: tuple, text: str) -> tuple | None:
+        """State after appending text, or None if text breaks the format"""
+        numbers, partial, fresh = state
+        for char in text:
+            if char == " ":
+                if partial:
+                    if not self._closes(partial, numbers):
+                        return None
+                    numbers, partial = numbers + (int(partial),), ""
+                elif not fresh:
+                    return None
+            elif char in DIGITS:
+                if len(numbers) == self.count:
+                    return None
+                partial += char
+                if not (self._closes(partial, numbers) or self._extends(partial, numbers)):
+                    return None
+            else:
+                return None
+            fresh = False
+        return numbers, partial, fresh
+
+    def parse(self, token_ids) -> tuple:
+        """State reached by generated token ids, stopping at the first EOS"""
+        state = self.initial_state
+        for token_id in token_ids:
+            if token_id == self.eos_token_id:
+                break
+            next_state = self.advance(state, self.candidates.get(token_id, "\0"))
+            if next_state is None:
+                break
+            state = next_state
+        return state
+
+    def numbers(self, state: tuple) -> list[int]:
+        numbers, partial, _ = state
+        if self._closes(partial, numbers):
+            numbers = numbers + (int(partial),)
+        return list(numbers)
+
+    def is_complete(self, state: tuple) -> bool:
+        return len(self.numbers(state)) == self.count
+
+    def is_finished(self, state: tuple) -> bool:
+        """Complete and nothing else could be written: the last number can't grow"""
+        numbers, partial, _ = state
+        return self.is_complete(state) and not self._extends(partial, numbers)
+
+    def allowed_tokens(self, state: tuple) -> list[int]:
+        return self._allowed(state)
+
+    def _compute_allowed(self, state: tuple) -> list[int]:
+        allowed = [token_id for token_id, text in self.candidates.items() if self.advance(state, text)]
+        if self.is_complete(state) and self.eos_token_id is not None:
+            allowed.append(self.eos_token_id)
+        return allowed
+
+
+class SixNumbersLogitsProcessor(LogitsProcessor):
+    """Masks every token that would not keep the completion a valid prefix of
+    six distinct numbers in range, so sampling only picks among those."""
+
+    def __init__(self, vocabulary: NumberVocabulary, prompt_length: int):
+        self.vocabulary = vocabulary
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        mask = torch.full_like(scores, float("-inf"))
+        for row, generated in enumerate(input_ids[:, self.prompt_length:].tolist()):
+            if self.vocabulary.eos_token_id in generated:
+                mask[row] = 0
+                continue
+            state = self.vocabulary.parse(generated)
+            mask[row, self.vocabulary.allowed_tokens(state)] = 0
+        return scores + mask
+
+
+class SixNumbersStoppingCriteria(StoppingCriteria):
+    """Stops a row as soon as its six numbers are final"""
+
+    def __init__(self, vocabulary: NumberVocabulary, prompt_length: int):
+        self.vocabulary = vocabulary
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        finished = [
+            self.vocabulary.is_finished(self.vocabulary.parse(generated))
+            for generated in input_ids[:, self.prompt_length:].tolist()
+        ]
+        return torch.tensor(finished, dtype=torch.bool, device=input_ids.device)
@@ -1,15 +1,39 @@
 import os
+import copy
 import json
+import time
 import logging
 import re
-from datetime import datetime
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from datetime import datetime, timedelta
+from transformers import AutoTokenizer, LogitsProcessorList, StoppingCriteriaList
 import torch
-import random
+from app.services.number_constraints import NumberVocabulary, SixNumbersLogitsProcessor, SixNumbersStoppingCriteria
+from app.services.inference_scheduler import InferenceScheduler
+from app.services.model_backends import load_model as load_backend_model
+from app.services.model_registry import ModelRegistry
+from app.services.service_loader import ServiceNotReady
+from app.services.draw_history import DrawHistory
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+PROMPT_PREFIX = "Predict numbers for"
+# Worst case per number is three single-character tokens: " ", "4", "2"
+MAX_NEW_TOKENS = 6 * 3
+
+class LoadedModel:
+    """One model version and everything derived from it, swapped as a unit"""
+
+    def __init__(self, version: str, tokenizer, model, engine: str):
+        self.version = version
+        self.tokenizer = tokenizer
+        self.model = model
+        self.engine = engine
+        self.number_vocabulary = NumberVocabulary(tokenizer)
+        self.prefix_ids = None
+        self.prefix_cache = None
+        self.timings_ms = {}
+
 class PreviewService:
     def __init__(self):
         self.use_s3 = os.getenv("USE_S3", "False").lower() == "true"
@@ -20,13 +44,29 @@ class PreviewService:
         self.output_dir = os.getenv("OUTPUT_DIR", "./finetuned_mega")
         self.model_path = os.path.abspath(self.output_dir)
         self.local_dataset_path = os.getenv("DATASET_PATH_LOCAL", "./dataset.json")
+        self.backend = os.getenv("INFERENCE_BACKEND", "pytorch").lower()
+        self.watch_interval = float(os.getenv("MODEL_WATCH_INTERVAL", "30"))
+        self.max_batch_size = int(os.getenv("INFERENCE_MAX_BATCH", "16"))
+        self.max_wait_ms = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+        self.max_queue = int(os.getenv("INFERENCE_MAX_QUEUE", "256"))
+        self.use_prefix_cache = os.getenv("PREFIX_CACHE", "True").lower() == "true"
+        self.merge_adapter = os.getenv("LORA_MERGE", "True").lower() == "true"
 
-        self.tokenizer = None
-        self.model = None
-        self.past_numbers = {}
+        self.history = DrawHistory.empty()
+        self.startup_ms = {}
+        self.registry = ModelRegistry(self.model_path, self._load_version, self.watch_interval)
 
         self.load_model()
+        self.registry.start()
+        started = time.perf_counter()
         self.load_dataset()
+        self.startup_ms["dataset"] = (time.perf_counter() - started) * 1000
+        self.scheduler = InferenceScheduler(
+            self.generate_batch,
+            max_batch_size=self.max_batch_size,
+            max_wait_ms=self.max_wait_ms,
+            max_queue=self.max_queue
+        )
 
     def _extract_date_from_string(self, text: str) -> datetime | None:
         if not text:
@@ -51,40 +91,61 @@ class PreviewService:
                 continue
         return None
 
-    def _register_past_numbers(self, date_obj: datetime, numbers: list[int]):
-        if not date_obj:
-            return
-        key_slash = date_obj.strftime("%d/%m/%Y")
-        self.past_numbers[key_slash] = numbers
-
     def load_model(self):
         logger.info("🔧 Loading model...")
-        if os.path.isdir(self.model_path) and (
-            os.path.exists(os.path.join(self.model_path, "pytorch_model.bin")) or
-            os.path.exists(os.path.join(self.model_path, "model.safetensors"))
-        ):
-            try:
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-                self.model = AutoModelForCausalLM.from_pretrained(self.model_path, device_map="auto")
-                if self.tokenizer.pad_token is None:
-                    self.tokenizer.pad_token = self.tokenizer.eos_token
-                logger.info(f"✅ Model loaded successfully from {self.model_path}")
-            except Exception as e:
-                logger.error(f"❌ Error loading model: {e}")
-                self.tokenizer = None
-                self.model = None
-        else:
+        if not self.registry.refresh() and self.registry.current is None:
             logger.warning(f"⚠️ No model found in {self.model_path}. Run fine-tuning first.")
 
+    def _load_version(self, version: str) -> LoadedModel:
+        """Called by the registry, off the request path, for every new version in OUTPUT_DIR.
+
+        The model is warmed up with a synthetic prediction before it is
+        returned, so lazy initialisation is never paid by a real request.
+        """
+        started = time.perf_counter()
+        tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        model, engine = load_backend_model(self.model_path, self.backend, self.merge_adapter)
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        loaded = LoadedModel(version, tokenizer, model, engine)
+        loaded.timings_ms["model_load"] = (time.perf_counter() - started) * 1000
+        logger.info(f"✅ Model loaded successfully from {self.model_path} ({engine})")
+
+        if self.use_prefix_cache:
+            started = time.perf_counter()
+            self._build_prefix_cache(loaded)
+            loaded.timings_ms["prefix_cache"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        self._generate(loaded, [datetime.today() + timedelta(days=1)])
+        loaded.timings_ms["warm_up"] = (time.perf_counter() - started) * 1000
+        logger.info(f"🔥 Warm-up generation took {loaded.timings_ms['warm_up']:.0f}ms")
+        return loaded
+
+    def _build_prefix_cache(self, loaded: LoadedModel):
+        """Run the constant prompt prefix through the model once and keep its past_key_values"""
+        try:
+            prefix_ids = loaded.tokenizer(PROMPT_PREFIX, return_tensors="pt").input_ids.to(loaded.model.device)
+            with torch.no_grad():
+                outputs = loaded.model(
+                    input_ids=prefix_ids,
+                    attention_mask=torch.ones_like(prefix_ids),
+                    use_cache=True
+                )
+            loaded.prefix_ids = prefix_ids
+            loaded.prefix_cache = outputs.past_key_values
+            logger.info(f"✅ Prefix cache built ({prefix_ids.shape[1]} tokens)")
+        except Exception as e:
+            logger.warning(f"⚠️ Prefix cache unavailable, prompts will be encoded in full: {e}")
+
     def load_dataset(self):
         logger.info("🔧 Loading dataset...")
         dataset = []
         if self.use_s3:
             try:
-                import boto3
-                s3 = boto3.client("s3", endpoint_url=self.localstack_url, region_name=self.region)
-                response = s3.get_object(Bucket=self.bucket, Key=self.dataset_file)
-                dataset = json.loads(response["Body"].read())
+                from app.services.dataset_store import DatasetStore
+                store = DatasetStore(self.bucket, self.dataset_file, self.region, self.localstack_url)
+                dataset = store.load()
                 logger.info(f"✅ Dataset loaded from S3 ({self.bucket}/{self.dataset_file})")
             except Exception as e:
                 logger.error(f"❌ Error loading dataset from S3: {e}")
@@ -96,85 +157,144 @@ class PreviewService:
             except Exception as e:
                 logger.error(f"❌ Error loading local dataset: {e}")
 
-        for entry in dataset:
-            prompt = entry.get("prompt", "")
-            completion = entry.get("completion", "")
-            date_obj = self._extract_date_from_string(prompt) or self._extract_date_from_string(completion)
-            if not date_obj:
-                continue
-            numbers_tokens = re.findall(r"\b\d+\b", completion)
-            numbers = [int(x) for x in numbers_tokens]
-            self._register_past_numbers(date_obj, numbers)
-
-    def generate_prediction(self, date_str: str) -> list[int]:
-        if self.tokenizer is None or self.model is None:
-            raise RuntimeError("Model not loaded yet. Run fine-tuning first.")
+        self.history = DrawHistory.from_records(dataset)
+        logger.info(f"📚 {len(self.history)} past draws indexed ({self.history.nbytes} bytes)")
 
+    def _parse_date(self, date_str: str) -> datetime:
         date_obj = self._extract_date_from_string(date_str)
         if not date_obj:
             normalized_try = " ".join(date_str.replace("/", " ").strip().split())
             date_obj = self._extract_date_from_string(normalized_try)
         if not date_obj:
             raise ValueError("Invalid date format. Use DD/MM/YYYY (or similar).")
+        return date_obj
 
-        key_slash = date_obj.strftime("%d/%m/%Y")
-        if key_slash in self.past_numbers:
-            logger.info(f"🔹 Found past numbers for {key_slash}: {self.past_numbers[key_slash]}")
-            return self.past_numbers[key_slash]
+    def _lookup(self, date_obj: datetime) -> list[int] | None:
+        """Known numbers (or [] for an undrawn past date); None when the model must predict"""
+        numbers = self.history.lookup(date_obj)
+        if numbers is not None:
+            logger.info(f"🔹 Found past numbers for {date_obj.strftime('%d/%m/%Y')}: {numbers}")
+            return numbers
 
         today = datetime.today().date()
         if date_obj.date() <= today:
             logger.info("⚠️ Date is in the past or today. No prediction possible.")
             return []
+        return None
 
-        prompt = f"Predict numbers for {key_slash}:"
-        logger.info(f"📝 Prompt sent to model: {prompt}")
+    def _prefix_cached_inputs(self, loaded: LoadedModel, suffixes: list[str]):
+        """Prefix + padded date suffixes, with a copy of the prefix cache expanded to the batch.
 
-        inputs = self.tokenizer(
-            prompt,
-            return_tensors="pt",
-            truncation=True,
-            padding="max_length",
-            max_length=128
-        )
+        generate only runs the tokens past the cached length, so the forward pass
+        before decoding covers just the date. Shorter suffixes are padded between
+        prefix and date (masked out), which keeps the cached prefix valid for every row.
+        """
+        encoded = loaded.tokenizer(suffixes, add_special_tokens=False).input_ids
+        longest = max(len(ids) for ids in encoded)
+        prefix = loaded.prefix_ids[0].tolist()
+        pad_id = loaded.tokenizer.pad_token_id
+
+        rows, masks = [], []
+        for ids in encoded:
+            padding = longest - len(ids)
+            rows.append(prefix + [pad_id] * padding + ids)
+            masks.append([1] * len(prefix) + [0] * padding + [1] * len(ids))
+
+        if hasattr(loaded.prefix_cache, "batch_repeat_interleave"):
+            # generate appends to the cache in place, so each call gets its own copy
+            past_key_values = copy.deepcopy(loaded.prefix_cache)
+            past_key_values.batch_repeat_interleave(len(rows))
+        else:
+            # Legacy tuple of (key, value) per layer, as the ONNX Runtime model returns
+            past_key_values = tuple(
+                tuple(tensor.repeat_interleave(len(rows), dim=0) for tensor in layer) for layer in loaded.prefix_cache
+            )
+
+        device = loaded.model.device
+        return torch.tensor(rows, device=device), torch.tensor(masks, device=device), past_key_values
+
+    def generate_batch(self, date_objs: list[datetime]) -> list[list[int]]:
+        """Predict several future dates with a single padded model.generate call"""
+        # One read of the registry: a reload swapping models mid-batch does not affect this call
+        loaded = self.registry.current
+        if loaded is None:
+            raise ServiceNotReady("Model not loaded yet. Run fine-tuning first.")
+        return self._generate(loaded, date_objs)
 
-        input_ids = inputs.input_ids.to(self.model.device)
-        attention_mask = inputs.attention_mask.to(self.model.device)
+    def _generate(self, loaded: LoadedModel, date_objs: list[datetime]) -> list[list[int]]:
+        suffixes = [f" {d.strftime('%d/%m/%Y')}:" for d in date_objs]
+        prompts = [PROMPT_PREFIX + suffix for suffix in suffixes]
+        logger.info(f"📝 Prompts sent to model: {prompts}")
 
-        output_ids = self.model.generate(
+        if loaded.prefix_cache is not None:
+            input_ids, attention_mask, past_key_values = self._prefix_cached_inputs(loaded, suffixes)
+        else:
+            # Pad to the longest prompt of this batch, on the left so every row
+            # ends right where generation starts
+            inputs = loaded.tokenizer(
+                prompts,
+                return_tensors="pt",
+                truncation=True,
+                max_length=128,
+                padding="longest",
+                padding_side="left"
+            )
+            input_ids = inputs.input_ids.to(loaded.model.device)
+            attention_mask = inputs.attention_mask.to(loaded.model.device)
+            past_key_values = None
+
+        prompt_length = input_ids.shape[1]
+        output_ids = loaded.model.generate(
             input_ids=input_ids,
             attention_mask=attention_mask,
-            max_new_tokens=32,
+            past_key_values=past_key_values,
+            logits_processor=LogitsProcessorList([SixNumbersLogitsProcessor(loaded.number_vocabulary, prompt_length)]),
+            stopping_criteria=StoppingCriteriaList([SixNumbersStoppingCriteria(loaded.number_vocabulary, prompt_length)]),
+            max_new_tokens=MAX_NEW_TOKENS,
             do_sample=True,
             temperature=0.8,
             top_p=0.9,
-            eos_token_id=self.tokenizer.eos_token_id,
-            pad_token_id=self.tokenizer.pad_token_id
-        )[0]
-
-        output_text = self.tokenizer.decode(output_ids, skip_special_tokens=True)
-        logger.info(f"📤 Raw model output: {output_text}")
-
-        numbers = [int(x) for x in re.findall(r"\b\d+\b", output_text)]
-        numbers = [n for n in numbers if 1 <= n <= 60]
+            eos_token_id=loaded.tokenizer.eos_token_id,
+            pad_token_id=loaded.tokenizer.pad_token_id
+        )
 
-        # Ensure exactly 6 unique numbers
-        final_numbers = []
-        for n in numbers:
-            if n not in final_numbers:
-                final_numbers.append(n)
-            if len(final_numbers) == 6:
-                break
-        while len(final_numbers) < 6:
-            candidate = random.randint(1, 60)
-            if candidate not in final_numbers:
-                final_numbers.append(candidate)
+        # Only the generated tokens: the prompt's date digits are not a prediction
+        generated_ids = output_ids[:, prompt_length:]
+        output_texts = loaded.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+        predictions = []
+        for prompt, output_text, ids in zip(prompts, output_texts, generated_ids.tolist()):
+            logger.info(f"📤 Raw model output for '{prompt}': {output_text}")
+            numbers = loaded.number_vocabulary.numbers(loaded.number_vocabulary.parse(ids))
+            if len(numbers) != 6:
+                raise RuntimeError(f"Constrained decoding ended with {len(numbers)} numbers: '{output_text}'")
+            predictions.append(numbers)
+        logger.info(f"🎯 Final predictions: {predictions}")
+        return predictions
 
-        logger.info(f"🎯 Final prediction: {final_numbers}")
-        return final_numbers
+    def generate_predictions(self, date_strs: list[str]) -> list[list[int]]:
+        """Past dates come from history; the future dates go to the scheduler as one
+        request, run in a single generate call, shared with any other request
+        arriving in the same window when they fit in INFERENCE_MAX_BATCH"""
+        date_objs = [self._parse_date(date_str) for date_str in date_strs]
+        results = [self._lookup(date_obj) for date_obj in date_objs]
 
+        pending = [i for i, numbers in enumerate(results) if numbers is None]
+        if not pending:
+            return results
+        if self.registry.current is None:
+            raise ServiceNotReady("Model not loaded yet. Run fine-tuning first.")
+        predictions = self.scheduler.submit([date_objs[i] for i in pending]).result()
+        for i, numbers in zip(pending, predictions):
+            results[i] = numbers
+        return results
 
-mega_service = PreviewService()
+    def generate_prediction(self, date_str: str) -> list[int]:
+        return self.generate_predictions([date_str])[0]
 
-def generate_prediction(date_str: str) -> list[int]:
-    return mega_service.generate_prediction(date_str)
+    def metrics(self) -> dict:
+        loaded = self.registry.current
+        return dict(
+            self.scheduler.metrics(),
+            engine=loaded.engine if loaded else None,
+            model_version=loaded.version if loaded else None
+        )
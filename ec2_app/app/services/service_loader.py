@@ -0,0 +1,76 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceNotReady(RuntimeError):
+    pass
+
+
+class PreviewServiceLoader:
+    """Builds the PreviewService in a background thread.
+
+    Importing torch/transformers, loading and warming up the model and reading
+    the dataset take long enough that doing it at import kept uvicorn from
+    binding. This module imports none of that, so controllers can depend on it
+    and answer 503 right away while the service is still loading.
+    """
+
+    def __init__(self):
+        self.service = None
+        self.state = "idle"
+        self.error = None
+        self.phases_ms = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = "loading"
+            self._thread = threading.Thread(target=self._load, name="preview-loader", daemon=True)
+            self._thread.start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            from app.services.preview_service import PreviewService
+            self.phases_ms["import"] = (time.perf_counter() - started) * 1000
+            self.service = PreviewService()
+            self.state = "ready"
+        except Exception as e:
+            logger.error(f"❌ Preview service failed to start: {e}")
+            self.error = str(e)
+            self.state = "failed"
+        self.phases_ms["total"] = (time.perf_counter() - started) * 1000
+
+    def get(self):
+        """The loaded service, or ServiceNotReady while it is still starting"""
+        if self.service is None:
+            raise ServiceNotReady(f"Preview service is {self.state}, retry shortly")
+        return self.service
+
+    def status(self) -> dict:
+        phases = {name: ms for name, ms in self.phases_ms.items() if name != "total"}
+        loaded = None
+        if self.service is not None:
+            phases.update(self.service.startup_ms)
+            loaded = self.service.registry.current
+            if loaded is not None:
+                phases.update(loaded.timings_ms)
+        if "total" in self.phases_ms:
+            phases["total"] = self.phases_ms["total"]
+        return {
+            "ready": loaded is not None,
+            "state": self.state,
+            "model_version": loaded.version if loaded else None,
+            "engine": loaded.engine if loaded else None,
+            "error": self.error,
+            "phases_ms": {name: round(ms, 1) for name, ms in phases.items()},
+        }
+
+
+preview_loader = PreviewServiceLoader()
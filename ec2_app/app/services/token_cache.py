@@ -0,0 +1,189 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+KEY_BYTES = 16
+
+
+def record_key(item: dict) -> str:
+    """Content hash of a dataset record; a corrected record counts as new"""
+    text = f"{item.get('prompt', '')}\x00{item.get('completion', '')}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:KEY_BYTES]
+
+
+def record_text(item: dict) -> str:
+    return item.get("prompt", "") + item.get("completion", "")
+
+
+def tokenizer_fingerprint(tokenizer, max_length: int) -> str:
+    """Hash of everything that changes the token ids: vocab, merges, special tokens, truncation"""
+    if getattr(tokenizer, "is_fast", False):
+        # Truncation and padding here are whatever the last call set, not part of the tokenizer
+        definition = json.loads(tokenizer.backend_tokenizer.to_str())
+        definition.pop("truncation", None)
+        definition.pop("padding", None)
+        definition = json.dumps(definition, sort_keys=True)
+    else:
+        definition = json.dumps(tokenizer.get_vocab(), sort_keys=True)
+    extra = json.dumps([type(tokenizer).__name__, tokenizer.all_special_tokens, max_length])
+    return hashlib.sha1(f"{definition}\x00{extra}".encode("utf-8")).hexdigest()[:KEY_BYTES]
+
+
+class TokenCache:
+    """Token ids of dataset records, kept on disk between training runs.
+
+    One directory per tokenizer fingerprint holds three columns as .npy files,
+    opened memory-mapped: tokens (int32, every record's ids back to back),
+    offsets (int64[N + 1], where each record starts) and keys (the record
+    content hashes). Records whose hash is already there are not tokenized
+    again, so a dataset that gained one contest costs one tokenizer call.
+    """
+
+    COLUMNS = ("tokens", "offsets", "keys")
+
+    def __init__(self, cache_dir: str, tokenizer, max_length: int = 64):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.directory = os.path.join(cache_dir, tokenizer_fingerprint(tokenizer, max_length))
+        self.tokens, self.offsets, self.keys = self._open()
+        self._rows = {key: row for row, key in enumerate(self.keys.tolist())}
+
+    def _path(self, column: str) -> str:
+        return os.path.join(self.directory, f"{column}.npy")
+
+    def _open(self):
+        try:
+            tokens, offsets, keys = (np.load(self._path(c), mmap_mode="r") for c in self.COLUMNS)
+            if len(offsets) == len(keys) + 1 and offsets[-1] == len(tokens):
+                logger.info(f"📦 Token cache: {len(keys)} record(s) in {self.directory}")
+                return tokens, offsets, keys
+            logger.warning(f"⚠️ Token cache in {self.directory} is inconsistent, rebuilding")
+        except (OSError, ValueError):
+            pass
+        return np.empty(0, np.int32), np.zeros(1, np.int64), np.empty(0, f"S{KEY_BYTES}")
+
+    def encode(self, records: list[dict], pack_to: int | None = None):
+        """Rows for records in order, tokenizing and appending the ones not cached yet.
+
+        With pack_to the rows come packed into blocks of that many tokens
+        (PackedRecords) instead of one padded record per item (TokenizedRecords).
+        """
+        keys = [record_key(item).encode("ascii") for item in records]
+        missing = {}
+        for key, item in zip(keys, records):
+            if key not in self._rows and key not in missing:
+                missing[key] = item
+        if missing:
+            self._append(list(missing), [record_text(item) for item in missing.values()])
+        logger.info(f"🔄 Tokenized {len(missing)} new record(s), {len(records) - len(missing)} from cache")
+        rows = [self._rows[key] for key in keys]
+        if pack_to:
+            return PackedRecords(self, rows, block_size=pack_to)
+        return TokenizedRecords(self, rows)
+
+    def _append(self, keys: list[bytes], texts: list[str]):
+        ids = self.tokenizer(texts, truncation=True, max_length=self.max_length)["input_ids"]
+        lengths = np.array([len(x) for x in ids], dtype=np.int64)
+        new_tokens = np.fromiter((t for x in ids for t in x), dtype=np.int32, count=int(lengths.sum()))
+
+        columns = {
+            "tokens": np.concatenate([self.tokens, new_tokens]),
+            "offsets": np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)]),
+            "keys": np.concatenate([self.keys, np.array(keys, dtype=f"S{KEY_BYTES}")]),
+        }
+        # Each column is replaced atomically; offsets goes last so a run cut
+        # short in between is caught by the consistency check in _open
+        os.makedirs(self.directory, exist_ok=True)
+        for column in ("tokens", "keys", "offsets"):
+            tmp = self._path(column) + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, columns[column])
+            os.replace(tmp, self._path(column))
+
+        start = len(self.keys)
+        self._rows.update({key: start + i for i, key in enumerate(keys)})
+        self.tokens, self.offsets, self.keys = (np.load(self._path(c), mmap_mode="r") for c in self.COLUMNS)
+
+
+class TokenizedRecords(torch.utils.data.Dataset):
+    """Training view over cached rows, padded to max_length like the tokenizer used to"""
+
+    def __init__(self, cache: TokenCache, rows: list[int]):
+        self.cache = cache
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index: int) -> dict:
+        row = self.rows[index]
+        start, end = self.cache.offsets[row], self.cache.offsets[row + 1]
+        ids = self.cache.tokens[start:end].tolist()
+        padding = self.cache.max_length - len(ids)
+        return {
+            "input_ids": ids + [self.cache.tokenizer.pad_token_id] * padding,
+            "attention_mask": [1] * len(ids) + [0] * padding,
+        }
+
+
+class PackedRecords(torch.utils.data.Dataset):
+    """Cached rows packed back to back into blocks of block_size tokens.
+
+    Each record is followed by EOS and records never straddle two blocks.
+    The items carry a block-diagonal causal mask (4D, additive, the form
+    GPT-Neo takes as-is), position ids restarting at every record and labels
+    that don't ask a record to predict the first token of the next one, so
+    every record is trained on exactly as if it were alone in its row. Use
+    with transformers.default_data_collator.
+    """
+
+    def __init__(self, cache: TokenCache, rows: list[int], block_size: int = 64):
+        self.cache = cache
+        self.block_size = block_size
+        self.blocks = []
+        block, used = [], 0
+        for row in rows:
+            length = min(int(cache.offsets[row + 1] - cache.offsets[row]) + 1, block_size)
+            if used + length > block_size:
+                self.blocks.append(block)
+                block, used = [], 0
+            block.append(row)
+            used += length
+        if block:
+            self.blocks.append(block)
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def __getitem__(self, index: int) -> dict:
+        eos, pad = self.cache.tokenizer.eos_token_id, self.cache.tokenizer.pad_token_id
+        input_ids, labels, position_ids, segments = [], [], [], []
+        for segment, row in enumerate(self.blocks[index]):
+            start, end = self.cache.offsets[row], self.cache.offsets[row + 1]
+            ids = (self.cache.tokens[start:end].tolist() + [eos])[:self.block_size]
+            input_ids += ids
+            labels += [-100] + ids[1:]
+            position_ids += range(len(ids))
+            segments += [segment] * len(ids)
+        padding = self.block_size - len(input_ids)
+        input_ids += [pad] * padding
+        labels += [-100] * padding
+        position_ids += [0] * padding
+        segments += [-1] * padding  # padding only sees padding, so no row is fully masked
+
+        segments = torch.tensor(segments)
+        causal = torch.ones(self.block_size, self.block_size, dtype=torch.bool).tril()
+        allowed = (segments[:, None] == segments[None, :]) & causal
+        mask = torch.zeros(1, self.block_size, self.block_size)
+        mask.masked_fill_(~allowed, torch.finfo(mask.dtype).min)
+        return {
+            "input_ids": torch.tensor(input_ids),
+            "attention_mask": mask,
+            "position_ids": torch.tensor(position_ids),
+            "labels": torch.tensor(labels),
+        }
@@ -0,0 +1,160 @@
+import os
+import queue
+import logging
+import threading
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# What a job reports about itself; cleared when the next job starts
+JOB_FIELDS = ("pid", "cpus", "threads", "step", "max_steps", "epoch", "loss")
+
+
+def parse_cpus(spec: str) -> set[int]:
+    """Parse a CPU list like "0-3,6" into {0, 1, 2, 3, 6}"""
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cpus.update(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def _training_process(events, full: bool, cpus: list[int], threads: int, nice: int):
+    """Entry point of the training process (spawned, so nothing is inherited from the API).
+
+    Affinity and thread counts are set before torch is imported, so its
+    OpenMP pool is sized for the CPUs the job owns.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if nice:
+        os.nice(nice)
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads)
+
+    try:
+        import torch
+        from transformers import TrainerCallback
+        from app.services.train_service import TrainService
+
+        torch.set_num_threads(threads)
+
+        class ProgressCallback(TrainerCallback):
+            def on_log(self, args, state, control, logs=None, **kwargs):
+                event = {"type": "progress", "step": state.global_step, "max_steps": state.max_steps, "epoch": state.epoch}
+                if logs and "loss" in logs:
+                    event["loss"] = logs["loss"]
+                events.put(event)
+
+        events.put({"type": "started", "pid": os.getpid(), "cpus": cpus, "threads": threads})
+        version = TrainService().train(full=full, callbacks=[ProgressCallback()])
+        message = f"Model version {version} published" if version else "Nothing new to train on"
+        events.put({"type": "completed", "message": message})
+    except Exception as e:
+        logger.error(f"❌ Training error: {e}")
+        events.put({"type": "failed", "message": str(e)})
+
+
+class TrainingExecutor:
+    """Runs training jobs in a separate process, one at a time.
+
+    Trainer.train() in the API process competed with /preview for the GIL,
+    torch threads and memory. The job runs in a spawned process pinned to
+    TRAIN_CPUS (default: the upper half of the CPUs this process may use)
+    with TRAIN_THREADS torch threads at TRAIN_NICE priority, and reports back
+    over a multiprocessing queue that a thread here folds into status().
+    Only an explicit TRAIN_CPUS takes those CPUs away from the API (see
+    reserve_api_cpus); by default the API keeps all of them, so /preview
+    loses nothing while no job runs.
+    """
+
+    def __init__(self):
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+        spec = os.getenv("TRAIN_CPUS", "")
+        self.dedicated_cpus = bool(spec)
+        if spec:
+            train_cpus = sorted(parse_cpus(spec))
+        elif len(available) >= 2:
+            train_cpus = available[len(available) // 2:]
+        else:
+            train_cpus = available
+        self.train_cpus = train_cpus
+        self.api_cpus = [cpu for cpu in available if cpu not in train_cpus] or available
+        self.threads = int(os.getenv("TRAIN_THREADS", "0")) or max(len(train_cpus), 1)
+        self.nice = int(os.getenv("TRAIN_NICE", "10"))
+
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._lock = threading.Lock()
+        self._job = 0
+        self._status = {"status": "idle", "message": "No training started yet"}
+
+    def reserve_api_cpus(self):
+        """With TRAIN_CPUS set, pin the API process to the other CPUs; call before torch is imported"""
+        if not self.dedicated_cpus:
+            return
+        if self.api_cpus and set(self.api_cpus) != set(self.train_cpus) and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, self.api_cpus)
+            logger.info(f"📌 API on CPUs {self.api_cpus}, training on {self.train_cpus}")
+
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self, full: bool = False):
+        """Launch a training job and return its id; RuntimeError if one is already running"""
+        with self._lock:
+            if self.is_running():
+                raise RuntimeError("Training already in progress")
+            events = self._context.Queue()
+            self._process = self._context.Process(
+                target=_training_process,
+                args=(events, full, self.train_cpus, self.threads, self.nice),
+                name="training",
+                daemon=True,
+            )
+            self._job += 1
+            self._status = dict.fromkeys(JOB_FIELDS, None)
+            self._status.update(status="running", message="Training in progress", job=self._job)
+            self._process.start()
+            threading.Thread(
+                target=self._follow, args=(self._job, self._process, events), name="training-events", daemon=True
+            ).start()
+            return self._job
+
+    def _report(self, job: int, fields: dict):
+        """Fold a job's events into status(), unless a newer job has started since"""
+        with self._lock:
+            if job == self._job:
+                self._status.update(fields)
+
+    def _follow(self, job, process, events):
+        outcome = None
+        while outcome is None:
+            try:
+                event = events.get(timeout=1)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                break
+            kind = event.pop("type")
+            if kind in ("completed", "failed"):
+                outcome = dict(event, status=kind)
+            else:
+                self._report(job, event)
+        # Still "running" until the process is gone, so a new job can't overlap it
+        process.join()
+        if outcome is None:
+            # Killed (OOM, signal) before it could report
+            outcome = {"status": "failed", "message": f"Training process exited with code {process.exitcode}"}
+        self._report(job, outcome)
+        logger.info(f"🏁 Training job {job} {outcome['status']}: {outcome['message']}")
+
+    def status(self) -> dict:
+        with self._lock:
+            return dict(self._status)
+
+
+training_executor = TrainingExecutor()
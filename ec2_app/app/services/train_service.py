@@ -1,48 +1,71 @@
 import os
 import logging
 import json
-from datasets import Dataset
+import random
+import shutil
+import torch
 from transformers import (
     AutoTokenizer,
     AutoModelForCausalLM,
     Trainer,
     TrainingArguments,
     DataCollatorForLanguageModeling,
+    default_data_collator,
 )
-import boto3
+from app.services.dataset_store import DatasetStore
+from app.services.draw_history import DATE_PATTERN
+from app.services.model_backends import export_onnx, is_adapter
+from app.services.model_registry import publish_model, write_version
+from app.services.token_cache import TokenCache, record_key, record_text
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+TRAIN_STATE_FILE = "train_state.json"
+
 
 class TrainService:
     def __init__(self):
         self.model_name = "EleutherAI/gpt-neo-125M"
-        self.output_dir = "./finetuned_mega"
+        # The same directory PreviewService's registry watches for new versions
+        self.output_dir = os.getenv("OUTPUT_DIR", "./finetuned_mega")
         self.use_s3 = os.getenv("USE_S3", "False").lower() == "true"
         self.bucket = os.getenv("S3_BUCKET", "my-bucket")
         self.dataset_file = os.getenv("DATASET_FILE", "dataset.json")
         self.region = os.getenv("REGION", "us-east-1")
         self.localstack_url = os.getenv("LOCALSTACK_URL_CONTAINER", "http://localstack:4566")
+        self.onnx_export = os.getenv("ONNX_EXPORT", "False").lower() == "true"
+        self.train_mode = os.getenv("TRAIN_MODE", "auto").lower()
+        self.replay_samples = int(os.getenv("REPLAY_SAMPLES", "256"))
+        self.incremental_epochs = int(os.getenv("INCREMENTAL_EPOCHS", "3"))
+        self.drift_threshold = float(os.getenv("DRIFT_THRESHOLD", "0.25"))
+        self.drift_holdout = int(os.getenv("DRIFT_HOLDOUT", "64"))
+        self.max_incremental_runs = int(os.getenv("MAX_INCREMENTAL_RUNS", "10"))
+        self.token_cache_dir = os.getenv("TOKEN_CACHE_DIR", "./token_cache")
+        self.pack_sequences = os.getenv("PACK_SEQUENCES", "False").lower() == "true"
+        self.pack_block_size = int(os.getenv("PACK_BLOCK_SIZE", "64"))
+        self.train_method = os.getenv("TRAIN_METHOD", "full").lower()
+        self.lora_r = int(os.getenv("LORA_R", "8"))
+        self.lora_alpha = int(os.getenv("LORA_ALPHA", "16"))
+        self.lora_dropout = float(os.getenv("LORA_DROPOUT", "0.05"))
+        self.lora_target_modules = os.getenv("LORA_TARGET_MODULES", "q_proj,k_proj,v_proj,out_proj").split(",")
+        self.lora_learning_rate = float(os.getenv("LORA_LEARNING_RATE", "5e-4"))
+        if self.train_method not in ("full", "lora"):
+            raise ValueError(f"Unknown TRAIN_METHOD '{self.train_method}'. Use full or lora")
 
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        self.model = None
 
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
 
-    def _load_dataset(self):
-        """Load dataset from S3 or local file"""
+    def _load_records(self):
+        """Load dataset records from S3 or local file"""
         data = []
         if self.use_s3:
             try:
-                s3 = boto3.client(
-                    "s3",
-                    endpoint_url=self.localstack_url,
-                    region_name=self.region
-                )
-                response = s3.get_object(Bucket=self.bucket, Key=self.dataset_file)
-                data = json.loads(response["Body"].read())
+                store = DatasetStore(self.bucket, self.dataset_file, self.region, self.localstack_url)
+                data = store.load()
                 logger.info(f"✅ Dataset loaded from S3 ({self.bucket}/{self.dataset_file})")
             except Exception as e:
                 logger.error(f"❌ Failed to load dataset from S3: {e}")
@@ -53,39 +76,163 @@ class TrainService:
             with open(self.dataset_file, "r", encoding="utf-8") as f:
                 data = json.load(f)
                 logger.info("✅ Dataset loaded locally")
+        return data
+
+    @staticmethod
+    def _texts(records):
+        return [record_text(item) for item in records]
 
-        texts = [item.get("prompt", "") + item.get("completion", "") for item in data]
-        return Dataset.from_dict({"text": texts})
+    def _load_state(self):
+        """What the model in output_dir was trained on, or None if it can't be resumed"""
+        path = os.path.join(self.output_dir, TRAIN_STATE_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
 
-    def _tokenize(self, examples):
-        """Tokenize dataset samples"""
-        return self.tokenizer(
-            examples["text"],
-            truncation=True,
-            padding="max_length",
-            max_length=64,
+    def _base_model(self):
+        """Fresh base weights; with TRAIN_METHOD=lora frozen under new trainable adapters"""
+        model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        if self.train_method != "lora":
+            return model
+        from peft import LoraConfig, get_peft_model
+        config = LoraConfig(
+            task_type="CAUSAL_LM",
+            r=self.lora_r,
+            lora_alpha=self.lora_alpha,
+            lora_dropout=self.lora_dropout,
+            target_modules=self.lora_target_modules,
         )
+        model = get_peft_model(model, config)
+        trainable, total = model.get_nb_trainable_parameters()
+        logger.info(f"🧩 LoRA: training {trainable:,} of {total:,} parameters ({trainable / total:.2%})")
+        return model
 
-    def train(self):
-        logger.info("📥 Loading dataset...")
-        dataset = self._load_dataset()
+    def _trained_model(self):
+        """The published model to resume from; an adapter comes back trainable on the base"""
+        if not is_adapter(self.output_dir):
+            return AutoModelForCausalLM.from_pretrained(self.output_dir)
+        from peft import PeftModel
+        base = AutoModelForCausalLM.from_pretrained(self.model_name)
+        return PeftModel.from_pretrained(base, self.output_dir, is_trainable=True)
 
-        logger.info("🔄 Tokenizing dataset...")
-        tokenized = dataset.map(self._tokenize, batched=True)
+    def _mean_loss(self, texts, batch_size=16):
+        """Mean LM loss of self.model over texts, tokenized the way training sees them"""
+        self.model.eval()
+        losses = []
+        with torch.no_grad():
+            for start in range(0, len(texts), batch_size):
+                batch = self.tokenizer(
+                    texts[start:start + batch_size], truncation=True, padding=True, max_length=64, return_tensors="pt"
+                ).to(self.model.device)
+                labels = batch.input_ids.masked_fill(batch.attention_mask == 0, -100)
+                losses.append(self.model(**batch, labels=labels).loss.item())
+        return sum(losses) / len(losses)
+
+    @staticmethod
+    def _draw_order(item):
+        """Sort key putting older draws first: the prompt's date, then the contest number"""
+        match = DATE_PATTERN.search(item.get("prompt", ""))
+        day, month, year = (int(g) for g in match.groups()) if match else (0, 0, 0)
+        return year, month, day, item.get("number", 0)
+
+    def _holdout(self, records):
+        """Records a full run leaves out, so drift compares unseen data with unseen data.
 
-        data_collator = DataCollatorForLanguageModeling(
-            tokenizer=self.tokenizer, mlm=False
+        Always the oldest draws, whatever order the dataset comes in, so every
+        full run holds out the same records and the newest ones are trained on.
+        """
+        size = min(self.drift_holdout, len(records) // 10)
+        return sorted(records, key=self._draw_order)[:size]
+
+    def _plan(self, records, state, full):
+        """Pick full or incremental training; returns (mode, new_records, holdout, reason)"""
+        trained = set(state["records"]) if state else set()
+        held_out = set(state.get("holdout", [])) if state else set()
+        holdout = [item for item in records if record_key(item) in held_out]
+        new_records = [item for item in records if record_key(item) not in trained | held_out]
+
+        if full or self.train_mode == "full":
+            return "full", new_records, self._holdout(records), "requested"
+        if state is None or state.get("base_model") != self.model_name:
+            return "full", new_records, self._holdout(records), f"no resumable model in {self.output_dir}"
+        if state.get("method", "full") != self.train_method:
+            return "full", new_records, self._holdout(records), f"switching to TRAIN_METHOD={self.train_method}"
+        if not new_records:
+            return "skip", new_records, holdout, "no new records"
+        runs = state.get("incremental_runs", 0)
+        if self.max_incremental_runs and runs >= self.max_incremental_runs:
+            return "full", new_records, self._holdout(records), f"{runs} incremental run(s) since the last full one"
+
+        self.model = self._trained_model()
+        if not holdout:
+            return "incremental", new_records, holdout, "no held-out records to measure drift"
+        # Drift: how much worse the current model does on the new draws than on
+        # draws it has never trained on either, so the gap between trained and
+        # unseen data cancels out
+        new_loss = self._mean_loss(self._texts(new_records))
+        holdout_loss = self._mean_loss(self._texts(holdout))
+        drift = new_loss / holdout_loss - 1
+        logger.info(
+            f"📈 Loss on {len(new_records)} new record(s): {new_loss:.4f}, "
+            f"on {len(holdout)} held-out: {holdout_loss:.4f} (drift {drift:+.1%})"
         )
+        if drift > self.drift_threshold:
+            self.model = None
+            return "full", new_records, self._holdout(records), f"drift {drift:.1%} above {self.drift_threshold:.0%}"
+        return "incremental", new_records, holdout, f"drift {drift:.1%}"
+
+    def train(self, full=False, callbacks=None):
+        """Train and publish a new model version; returns it, or None when there was nothing to train"""
+        logger.info("📥 Loading dataset...")
+        records = self._load_records()
+        state = self._load_state()
+
+        mode, new_records, holdout, reason = self._plan(records, state, full)
+        if mode == "skip":
+            logger.info(f"⏭️ Nothing to train: {reason}")
+            return None
+        logger.info(f"🧭 {mode.capitalize()} training ({reason})")
+
+        holdout_keys = {record_key(item) for item in holdout}
+        if mode == "full":
+            self.model = self._base_model()
+            train_records = [item for item in records if record_key(item) not in holdout_keys]
+            epochs = 10
+        else:
+            # New draws plus a bounded replay of older ones, so the model
+            # doesn't drift towards the last few contests
+            skip_keys = holdout_keys | {record_key(item) for item in new_records}
+            old_records = [item for item in records if record_key(item) not in skip_keys]
+            replay = random.sample(old_records, min(self.replay_samples, len(old_records)))
+            train_records = new_records + replay
+            epochs = self.incremental_epochs
+        logger.info(f"📚 Training on {len(train_records)} record(s) for {epochs} epoch(s)")
+
+        logger.info("🔄 Tokenizing dataset...")
+        cache = TokenCache(self.token_cache_dir, self.tokenizer, max_length=64)
+        if self.pack_sequences:
+            # Several records per row instead of one record and ~2/3 padding;
+            # labels and masks come ready from PackedRecords
+            tokenized = cache.encode(train_records, pack_to=self.pack_block_size)
+            data_collator = default_data_collator
+            logger.info(f"🧱 Packed {len(train_records)} record(s) into {len(tokenized)} block(s) of {self.pack_block_size} tokens")
+        else:
+            tokenized = cache.encode(train_records)
+            data_collator = DataCollatorForLanguageModeling(
+                tokenizer=self.tokenizer, mlm=False
+            )
 
         training_args = TrainingArguments(
             output_dir=self.output_dir,
             overwrite_output_dir=True,
-            num_train_epochs=10,
+            num_train_epochs=epochs,
             per_device_train_batch_size=2,
             save_strategy="epoch",
             logging_dir="./logs",
             logging_steps=10,
-            learning_rate=1e-4,
+            learning_rate=self.lora_learning_rate if self.train_method == "lora" else 1e-4,
             weight_decay=0.01,
         )
 
@@ -95,18 +242,51 @@ class TrainService:
             train_dataset=tokenized,
             tokenizer=self.tokenizer,
             data_collator=data_collator,
+            callbacks=callbacks,
         )
 
         logger.info("🚀 Starting training...")
         trainer.train()
 
+        # Saved aside and moved in whole, so a running API never loads half a model
+        staging_dir = f"{self.output_dir.rstrip(os.sep)}.staging"
         logger.info("💾 Saving model to %s", self.output_dir)
-        trainer.save_model(self.output_dir)
-        self.tokenizer.save_pretrained(self.output_dir)
+        # Leftovers of a crashed run (e.g. an adapter_config.json) must not be published with this model
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        trainer.save_model(staging_dir)
+        self.tokenizer.save_pretrained(staging_dir)
+        self._save_state(staging_dir, records, holdout_keys, state, mode)
+        publish_model(staging_dir, self.output_dir)
         logger.info("✅ Training completed!")
 
+        if self.onnx_export:
+            try:
+                export_onnx(os.path.abspath(self.output_dir))
+            except Exception as e:
+                # Serving falls back to PyTorch while the export is missing or stale
+                logger.error(f"❌ ONNX export failed: {e}")
+
+        # Written last: the API's model registry reloads when this changes
+        version = write_version(self.output_dir)
+        logger.info(f"🏷️ Model version {version} published")
+        return version
+
+
+    def _save_state(self, directory, records, holdout_keys, state, mode):
+        """Record what the saved model has seen and what it must never see, for the next incremental run"""
+        incremental_runs = 0 if mode == "full" else state.get("incremental_runs", 0) + 1
+        with open(os.path.join(directory, TRAIN_STATE_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "base_model": self.model_name,
+                "method": self.train_method,
+                "mode": mode,
+                "incremental_runs": incremental_runs,
+                "records": [key for key in map(record_key, records) if key not in holdout_keys],
+                "holdout": sorted(holdout_keys),
+            }, f)
+
 
-def train_model():
-    """Wrapper called by controller"""
+def train_model(full=False):
+    """Train in the calling process; the API goes through train_executor.training_executor"""
     service = TrainService()
-    service.train()
+    return service.train(full=full)
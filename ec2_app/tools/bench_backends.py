@@ -0,0 +1,123 @@
+"""Compares INFERENCE_BACKEND choices against the fp32 PyTorch model on CPU.
+
+For each backend it reports load time, serialized weight size, resident
+memory growth, generate latency for a batch of future dates and how often its
+greedy output agrees with fp32: next-token top-1 over the dataset prompts and
+exact match of the generated completion.
+
+    OUTPUT_DIR=./finetuned_mega python tools/bench_backends.py --backends pytorch int8 onnx --runs 10
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import torch  # noqa: E402
+from transformers import AutoTokenizer  # noqa: E402
+
+
+def rss_mb():
+    """Resident set size of this process (Linux, like the EC2 hosts)"""
+    with open("/proc/self/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def weights_mb(model):
+    if not hasattr(model, "state_dict"):
+        # ONNX Runtime model: the graph file holds the weights
+        return os.path.getsize(model.model_path) / 2**20
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+
+def greedy(model, tokenizer, prompts, new_tokens):
+    inputs = tokenizer(prompts, return_tensors="pt", padding="longest", padding_side="left")
+    with torch.no_grad():
+        output_ids = model.generate(
+            **inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+            do_sample=False, pad_token_id=tokenizer.pad_token_id
+        )
+    return output_ids[:, inputs.input_ids.shape[1]:]
+
+
+def next_token_predictions(model, tokenizer, texts):
+    inputs = tokenizer(texts, return_tensors="pt", padding="longest")
+    with torch.no_grad():
+        logits = model(**inputs).logits
+    return logits.argmax(-1)[inputs.attention_mask.bool()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("OUTPUT_DIR", "./finetuned_mega"))
+    parser.add_argument("--dataset", default=os.path.join(BASE_DIR, "dataset.json"))
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "int8"])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--new-tokens", type=int, default=18)
+    parser.add_argument("--samples", type=int, default=64, help="Dataset prompts used for the agreement check")
+    args = parser.parse_args()
+
+    from app.services.model_backends import load_model
+
+    model_path = os.path.abspath(args.model)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        dataset = json.load(f)[:args.samples]
+    texts = [item["prompt"] + item["completion"] for item in dataset]
+    first_date = datetime.today() + timedelta(days=1)
+    prompts = [f"Predict numbers for {(first_date + timedelta(days=i)).strftime('%d/%m/%Y')}:"
+               for i in range(args.batch_size)]
+
+    reference = None
+    print(f"Model: {model_path} | threads={torch.get_num_threads()} batch={args.batch_size} "
+          f"new_tokens={args.new_tokens}")
+    for backend in args.backends:
+        rss_before = rss_mb()
+        started = time.perf_counter()
+        model, engine = load_model(model_path, backend)
+        load_s = time.perf_counter() - started
+        if engine != backend:
+            print(f"{backend:<8} not available, skipped")
+            continue
+        rss_growth = rss_mb() - rss_before
+
+        greedy(model, tokenizer, prompts, args.new_tokens)  # warm-up
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            completions = greedy(model, tokenizer, prompts, args.new_tokens)
+            timings.append((time.perf_counter() - started) * 1000)
+        next_tokens = next_token_predictions(model, tokenizer, texts)
+
+        if reference is None:
+            reference = (backend, completions, next_tokens)
+            agreement = ""
+        else:
+            _, ref_completions, ref_next_tokens = reference
+            top1 = (next_tokens == ref_next_tokens).float().mean().item()
+            exact = (completions == ref_completions).all(dim=1).float().mean().item()
+            agreement = f" | vs {reference[0]}: top-1 {top1:.1%}, completions {exact:.1%}"
+
+        median = statistics.median(timings)
+        print(f"{backend:<8} load={load_s:5.1f}s weights={weights_mb(model):7.1f}MB rss+={rss_growth:7.1f}MB "
+              f"generate median={median:7.1f}ms per-request={median / args.batch_size:6.1f}ms{agreement}")
+        del model
+
+
+if __name__ == "__main__":
+    main()
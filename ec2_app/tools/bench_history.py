@@ -0,0 +1,103 @@
+"""Past-draw lookup benchmark: the old "dd/mm/yyyy" -> list[int] dict against DrawHistory.
+
+Reports build time, memory held by the structure (tracemalloc, which also sees
+NumPy buffers) and lookup latency for dates with and without a draw. --scale
+repeats the dataset with shifted dates to see how both grow.
+
+    python tools/bench_history.py --dataset ../lambda_function/dataset.json --scale 10
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from app.services.draw_history import DrawHistory, DATE_PATTERN  # noqa: E402
+
+
+def build_dict(records):
+    """What PreviewService.load_dataset used to build"""
+    past_numbers = {}
+    for entry in records:
+        prompt = entry.get("prompt", "")
+        completion = entry.get("completion", "")
+        m = DATE_PATTERN.search(prompt) or DATE_PATTERN.search(completion)
+        if not m:
+            continue
+        day, month, year = (int(g) for g in m.groups())
+        key = datetime(year, month, day).strftime("%d/%m/%Y")
+        past_numbers[key] = [int(x) for x in re.findall(r"\b\d+\b", completion)]
+    return past_numbers
+
+
+def scaled(records, scale):
+    """The dataset repeated scale times, each copy moved 400 years ahead"""
+    out = []
+    for copy in range(scale):
+        for record in records:
+            m = DATE_PATTERN.search(record["prompt"])
+            day, month, year = m.groups()
+            # Whole 400-year cycles keep 29/02 on a leap year
+            shifted = f"{day} {month} {int(year) + 400 * copy}"
+            out.append(dict(record, prompt=DATE_PATTERN.sub(shifted, record["prompt"], count=1)))
+    return out
+
+
+def measure(build, records):
+    tracemalloc.start()
+    started = time.perf_counter()
+    structure = build(records)
+    build_ms = (time.perf_counter() - started) * 1000
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, build_ms, memory
+
+
+def lookup_ns(lookup, dates, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for d in dates:
+            lookup(d)
+    return (time.perf_counter() - started) / (rounds * len(dates)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=os.path.join(BASE_DIR, "dataset.json"))
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        records = scaled(json.load(f), args.scale)
+
+    past_numbers, dict_ms, dict_bytes = measure(build_dict, records)
+    history, history_ms, history_bytes = measure(DrawHistory.from_records, records)
+
+    rng = random.Random(0)
+    hits = [datetime.strptime(k, "%d/%m/%Y") for k in rng.sample(sorted(past_numbers), min(args.lookups, len(past_numbers)))]
+    misses = [d + timedelta(days=1) for d in hits if d + timedelta(days=1) not in hits]
+
+    def dict_lookup(d):
+        return past_numbers.get(d.strftime("%d/%m/%Y"))
+
+    assert all(dict_lookup(d) == history.lookup(d) for d in hits)
+    print(f"{len(records)} records | dict {len(past_numbers)} keys, DrawHistory {len(history)} rows")
+    for name, build_time, memory, lookup in (
+        ("dict", dict_ms, dict_bytes, dict_lookup),
+        ("DrawHistory", history_ms, history_bytes, history.lookup),
+    ):
+        print(f"{name:<12} build={build_time:7.1f}ms memory={memory / 1024:8.1f}KiB "
+              f"hit={lookup_ns(lookup, hits, args.rounds):6.0f}ns miss={lookup_ns(lookup, misses, args.rounds):6.0f}ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Training throughput benchmark: one padded record per row against packed rows.
+
+Runs the same number of optimizer steps over the dataset both ways, with the
+batches TrainService would build (TokenizedRecords + DataCollatorForLanguageModeling
+against PackedRecords + default_data_collator), and reports steps/s, the
+trained (non-padding) tokens per step and per second, and steps per epoch.
+
+    python tools/bench_packing.py --dataset ../lambda_function/dataset.json --steps 30 --batch-size 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import torch  # noqa: E402
+from transformers import (  # noqa: E402
+    AutoTokenizer,
+    AutoModelForCausalLM,
+    DataCollatorForLanguageModeling,
+    default_data_collator,
+)
+from app.services.token_cache import TokenCache  # noqa: E402
+
+
+def run(model_name, dataset, collator, batch_size, steps):
+    """Seconds per step and trained tokens per step over `steps` optimizer steps"""
+    torch.manual_seed(0)
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    model.train()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4, weight_decay=0.01)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True, collate_fn=collator)
+
+    batches = iter(loader)
+    timings, tokens = [], 0
+    for step in range(steps + 1):
+        try:
+            batch = next(batches)
+        except StopIteration:
+            batches = iter(loader)
+            batch = next(batches)
+        started = time.perf_counter()
+        loss = model(**batch).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        if step:  # the first step warms up allocations and kernels
+            timings.append(time.perf_counter() - started)
+            tokens += int((batch["labels"][:, 1:] != -100).sum())
+    return sum(timings) / steps, tokens / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("BASE_MODEL", "EleutherAI/gpt-neo-125M"))
+    parser.add_argument("--dataset", default=os.path.join(BASE_DIR, "dataset.json"))
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--block-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads, defaults to torch's choice")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        records = json.load(f)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TokenCache(cache_dir, tokenizer, max_length=64)
+        modes = {
+            "padded": (cache.encode(records), DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)),
+            "packed": (cache.encode(records, pack_to=args.block_size), default_data_collator),
+        }
+        print(f"Model: {args.model} | {len(records)} records | batch={args.batch_size} "
+              f"block={args.block_size} threads={torch.get_num_threads()}")
+        baseline = None
+        for mode, (dataset, collator) in modes.items():
+            step_s, tokens = run(args.model, dataset, collator, args.batch_size, args.steps)
+            baseline = baseline or tokens / step_s
+            print(
+                f"{mode:<7} rows={len(dataset):<5} steps/epoch={-(-len(dataset) // args.batch_size):<5} "
+                f"step={step_s * 1000:7.1f}ms tokens/step={tokens:6.1f} tokens/s={tokens / step_s:8.0f} "
+                f"({tokens / step_s / baseline:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
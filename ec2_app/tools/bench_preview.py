@@ -0,0 +1,99 @@
+"""CPU latency benchmark for the /preview prompt encodings.
+
+Times one model.generate per batch of future dates with the finetuned model in
+OUTPUT_DIR, for each way of building the prompt tensors:
+
+    max_length  every prompt right-padded to 128 tokens (the old behaviour)
+    longest     left-padded to the longest prompt of the batch
+    prefix      constant prefix served from the cached past_key_values
+
+Every mode decodes the same number of tokens, so only the prompt cost differs.
+
+    OUTPUT_DIR=./finetuned_mega python tools/bench_preview.py --batch-sizes 1 8 --runs 20
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import torch  # noqa: E402
+
+
+def build_inputs(service, loaded, mode, date_objs):
+    from app.services.preview_service import PROMPT_PREFIX
+
+    suffixes = [f" {d.strftime('%d/%m/%Y')}:" for d in date_objs]
+    if mode == "prefix":
+        return service._prefix_cached_inputs(loaded, suffixes)
+
+    prompts = [PROMPT_PREFIX + suffix for suffix in suffixes]
+    if mode == "max_length":
+        inputs = loaded.tokenizer(prompts, return_tensors="pt", truncation=True, padding="max_length", max_length=128)
+    else:
+        inputs = loaded.tokenizer(
+            prompts, return_tensors="pt", truncation=True, max_length=128, padding="longest", padding_side="left"
+        )
+    return inputs.input_ids, inputs.attention_mask, None
+
+
+def time_generate(service, loaded, mode, date_objs, new_tokens):
+    started = time.perf_counter()
+    input_ids, attention_mask, past_key_values = build_inputs(service, loaded, mode, date_objs)
+    with torch.no_grad():
+        loaded.model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            past_key_values=past_key_values,
+            max_new_tokens=new_tokens,
+            min_new_tokens=new_tokens,
+            do_sample=False,
+            pad_token_id=loaded.tokenizer.pad_token_id
+        )
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--new-tokens", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads, defaults to torch's choice")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    # The benchmark builds its own service; keep it on CPU
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+    os.environ.setdefault("MODEL_WATCH_INTERVAL", "0")
+    from app.services.preview_service import PreviewService
+
+    service = PreviewService()
+    loaded = service.registry.current
+    if loaded is None:
+        sys.exit(f"No model found in {service.model_path}")
+    modes = ["max_length", "longest"] + (["prefix"] if loaded.prefix_cache is not None else [])
+
+    print(f"Model: {service.model_path} | threads={torch.get_num_threads()} new_tokens={args.new_tokens}")
+    first_date = datetime.today() + timedelta(days=1)
+    for batch_size in args.batch_sizes:
+        date_objs = [first_date + timedelta(days=i) for i in range(batch_size)]
+        baseline = None
+        for mode in modes:
+            time_generate(service, loaded, mode, date_objs, args.new_tokens)  # warm-up
+            timings = [time_generate(service, loaded, mode, date_objs, args.new_tokens) for _ in range(args.runs)]
+            median = statistics.median(timings)
+            baseline = baseline or median
+            print(
+                f"batch={batch_size:<3} {mode:<10} median={median:8.1f}ms "
+                f"per-request={median / batch_size:7.1f}ms p90={statistics.quantiles(timings, n=10)[-1]:8.1f}ms "
+                f"({baseline / median:.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
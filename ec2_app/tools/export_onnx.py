@@ -0,0 +1,27 @@
+"""Exports the fine-tuned model to <OUTPUT_DIR>-onnx for INFERENCE_BACKEND=onnx.
+
+Training does this itself with ONNX_EXPORT=True; run this for a model trained
+without it, or after upgrading optimum/onnxruntime. Needs optimum[onnxruntime].
+
+    OUTPUT_DIR=./finetuned_mega python tools/export_onnx.py
+"""
+import os
+import sys
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("OUTPUT_DIR", "./finetuned_mega"))
+    args = parser.parse_args()
+
+    from app.services.model_backends import export_onnx
+
+    print(f"Exported to {export_onnx(os.path.abspath(args.model))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import os
+import copy
+import gzip
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# "single" keeps the whole history in DATASET_FILE, "sharded" keeps immutable
+# shards of SHARD_SIZE contests under DATASET_PREFIX plus a manifest
+DATASET_LAYOUT = os.getenv("DATASET_LAYOUT", "single").lower()
+DATASET_PREFIX = os.getenv("DATASET_PREFIX", "dataset/")
+SHARD_SIZE = int(os.getenv("SHARD_SIZE", "500"))
+# none | gzip | zstd (zstd needs the zstandard package, otherwise gzip is used)
+DATASET_COMPRESSION = os.getenv("DATASET_COMPRESSION", "none").lower()
+# Parsed objects kept between warm invocations, revalidated by ETag
+CACHE_DIR = os.getenv("DATASET_CACHE_DIR", "/tmp/dataset_cache")
+CACHE_MAX_ENTRIES = int(os.getenv("DATASET_CACHE_ENTRIES", "16"))
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def encode_records(records):
+    return json.dumps(records, ensure_ascii=False).encode("utf-8")
+
+
+def dataset_metadata(last_number, total_records, body):
+    """S3 object metadata that lets the next invocation skip the download"""
+    return {
+        "last-number": str(last_number),
+        "total-records": str(total_records),
+        "sha256": hashlib.sha256(body).hexdigest()
+    }
+
+
+def head_metadata(s3, bucket, key):
+    """HEAD an object; returns its metadata, or None if missing or written without it"""
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+            logger.error(f"Error reading metadata of {key}: {e}")
+        return None
+    metadata = head.get("Metadata", {})
+    if "last-number" not in metadata:
+        return None
+    return metadata
+
+
+def find_missing_contests(numbers, first, last):
+    """Contest numbers in first..last absent from numbers, in one O(n) pass"""
+    if last < first:
+        return []
+    seen = bytearray(last - first + 1)
+    for number in numbers:
+        if first <= number <= last:
+            seen[number - first] = 1
+    return [first + i for i, present in enumerate(seen) if not present]
+
+
+def compress(body):
+    """Returns (data, content_encoding) for DATASET_COMPRESSION"""
+    if DATASET_COMPRESSION == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(body), "zstd"
+    if DATASET_COMPRESSION in ("gzip", "zstd"):
+        return gzip.compress(body, mtime=0), "gzip"
+    return body, None
+
+
+def decompress(data, content_encoding):
+    if content_encoding == "gzip":
+        return gzip.decompress(data)
+    if content_encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Object is zstd-encoded but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+class ObjectCache:
+    """Parsed JSON objects keyed by S3 key, tagged with their ETag.
+
+    Lives at module level (and mirrored under CACHE_DIR) so warm containers
+    only pay a conditional GET. Bounded to max_entries, least recently used
+    first out.
+    """
+
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key):
+        """Returns (etag, parsed) or None; callers get their own copy"""
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self._read_disk(key)
+            if entry is None:
+                return None
+            self.entries[key] = entry
+        self.entries.move_to_end(key)
+        etag, parsed = entry
+        return etag, copy.copy(parsed)
+
+    def put(self, key, etag, parsed):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (etag, copy.copy(parsed))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            self._remove_disk(evicted)
+        self._write_disk(key, etag, parsed)
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+        self._remove_disk(key)
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            return cached["etag"], cached["data"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key, etag, parsed):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "etag": etag, "data": parsed}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write cache entry for {key}: {e}")
+
+    def _remove_disk(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+cache = ObjectCache(CACHE_DIR, CACHE_MAX_ENTRIES)
+
+
+def put_json(s3, bucket, key, body, parsed, metadata=None, compressed=True):
+    """PUT a JSON body, compressed per DATASET_COMPRESSION and tagged with ContentEncoding.
+
+    parsed is the object body encodes; it replaces the cached copy under the new ETag.
+    """
+    data, encoding = compress(body) if compressed else (body, None)
+    kwargs = {"ContentType": "application/json", "Metadata": metadata or {}}
+    if encoding:
+        kwargs["ContentEncoding"] = encoding
+    cache.invalidate(key)
+    response = s3.put_object(Bucket=bucket, Key=key, Body=data, **kwargs)
+    if response.get("ETag"):
+        cache.put(key, response["ETag"], parsed)
+
+
+def read_json(s3, bucket, key, sha256=None):
+    """GET and parse an object (None if missing), reusing the cached copy on a 304.
+
+    When sha256 is given, a fresh download must match it (hash of the decoded JSON).
+    """
+    cached = cache.get(key)
+    kwargs = {"IfNoneMatch": cached[0]} if cached else {}
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key, **kwargs)
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if cached and code in ("304", "NotModified"):
+            logger.info(f"{key} not modified, using cached copy.")
+            return cached[1]
+        if code in ("404", "NoSuchKey"):
+            cache.invalidate(key)
+            return None
+        raise
+    body = decompress(response["Body"].read(), response.get("ContentEncoding"))
+    if sha256 is not None and hashlib.sha256(body).hexdigest() != sha256:
+        raise ValueError(f"Hash mismatch for {key}")
+    parsed = json.loads(body)
+    cache.put(key, response["ETag"], parsed)
+    return parsed
+
+
+class SingleFileStore:
+    """Whole dataset in one JSON object, rewritten on every save"""
+
+    def __init__(self, s3, bucket, key):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.total_records = 0
+
+    def read_metadata(self):
+        return head_metadata(self.s3, self.bucket, self.key)
+
+    def load(self):
+        logger.info(f"Reading {self.key} from bucket {self.bucket}...")
+        records = read_json(self.s3, self.bucket, self.key)
+        if records is None:
+            logger.warning(f"{self.key} not found. Creating a new dataset...")
+            records = []
+        self.total_records = len(records)
+        logger.info(f"Dataset loaded. Total records: {self.total_records}")
+        return records
+
+    def load_gaps(self):
+        """Load every record plus the contest numbers missing below the newest one"""
+        records = self.load()
+        last_number = records[0]["number"] if records else 0
+        return records, find_missing_contests((r["number"] for r in records), 1, last_number)
+
+    def save(self, records):
+        body = encode_records(records)
+        last_number = records[0]["number"] if records else 0
+        metadata = dataset_metadata(last_number, len(records), body)
+        put_json(self.s3, self.bucket, self.key, body, records, metadata)
+        self.total_records = len(records)
+        return metadata
+
+
+class ShardedStore:
+    """Immutable shards of shard_size contests plus a manifest with their hashes.
+
+    Shard i holds contests i*shard_size+1 .. (i+1)*shard_size, newest first.
+    Only the records handed to load() callers can change, so a save rewrites
+    the tail shard (or a repaired one) and the manifest, never the full history.
+    """
+
+    def __init__(self, s3, bucket, prefix, shard_size):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.manifest_key = f"{prefix}manifest.json"
+        self.manifest = self._empty_manifest()
+        self.loaded_shards = set()
+        self.total_records = 0
+
+    def _empty_manifest(self):
+        return {"version": 1, "shard_size": self.shard_size, "last_number": 0, "total_records": 0, "shards": []}
+
+    def shard_index(self, number):
+        return (number - 1) // self.shard_size
+
+    def shard_key(self, index):
+        return f"{self.prefix}shard-{index:05d}.json"
+
+    def read_metadata(self):
+        return head_metadata(self.s3, self.bucket, self.manifest_key)
+
+    def _read_manifest(self):
+        manifest = read_json(self.s3, self.bucket, self.manifest_key)
+        if manifest is None:
+            logger.warning(f"{self.manifest_key} not found. Creating a new sharded dataset...")
+            return self._empty_manifest()
+        if manifest.get("shard_size") != self.shard_size:
+            raise ValueError(
+                f"Manifest shard size {manifest.get('shard_size')} does not match SHARD_SIZE={self.shard_size}"
+            )
+        return manifest
+
+    def _read_shard(self, entry):
+        records = read_json(self.s3, self.bucket, entry["key"], entry["sha256"])
+        if records is None:
+            raise ValueError(f"Shard {entry['key']} listed in the manifest is missing")
+        return records
+
+    def load(self):
+        """Load only the tail shard, which is all a backfill needs to append"""
+        self.manifest = self._read_manifest()
+        shards = sorted(self.manifest["shards"], key=lambda e: e["index"], reverse=True)[:1]
+        records = []
+        for entry in shards:
+            records.extend(self._read_shard(entry))
+            self.loaded_shards.add(entry["index"])
+        self.total_records = self.manifest["total_records"]
+        logger.info(f"Loaded {len(shards)} shard(s) from {self.manifest_key}. Total records: {self.total_records}")
+        return records
+
+    def load_gaps(self):
+        """Like SingleFileStore.load_gaps, but skips shards the manifest shows as complete"""
+        self.manifest = self._read_manifest()
+        entries = {e["index"]: e for e in self.manifest["shards"]}
+        last_number = self.manifest["last_number"]
+        records = []
+        missing = []
+        for index in range(self.shard_index(last_number) + 1 if last_number else 0):
+            first = index * self.shard_size + 1
+            last = min((index + 1) * self.shard_size, last_number)
+            entry = entries.get(index)
+            if entry is not None and entry["count"] == last - first + 1:
+                continue
+            shard_records = self._read_shard(entry) if entry is not None else []
+            self.loaded_shards.add(index)
+            records.extend(shard_records)
+            missing.extend(find_missing_contests((r["number"] for r in shard_records), first, last))
+        self.total_records = self.manifest["total_records"]
+        return records, missing
+
+    def save(self, records):
+        entries = {e["index"]: e for e in self.manifest["shards"]}
+        groups = {}
+        for record in records:
+            groups.setdefault(self.shard_index(record["number"]), []).append(record)
+
+        for index, group in groups.items():
+            if index in entries and index not in self.loaded_shards:
+                # Never overwrite a shard with a partial view of it
+                known = {r["number"] for r in group}
+                group.extend(r for r in self._read_shard(entries[index]) if r["number"] not in known)
+                self.loaded_shards.add(index)
+            group.sort(key=lambda r: r["number"], reverse=True)
+            body = encode_records(group)
+            digest = hashlib.sha256(body).hexdigest()
+            if index in entries and entries[index]["sha256"] == digest:
+                continue
+            key = self.shard_key(index)
+            put_json(self.s3, self.bucket, key, body, group)
+            entries[index] = {
+                "index": index,
+                "key": key,
+                "first": group[-1]["number"],
+                "last": group[0]["number"],
+                "count": len(group),
+                "sha256": digest
+            }
+            logger.info(f"Shard {key} written ({len(group)} records).")
+
+        shards = sorted(entries.values(), key=lambda e: e["index"])
+        self.manifest = {
+            "version": 1,
+            "shard_size": self.shard_size,
+            "last_number": shards[-1]["last"] if shards else 0,
+            "total_records": sum(e["count"] for e in shards),
+            "shards": shards
+        }
+        body = encode_records(self.manifest)
+        metadata = dataset_metadata(self.manifest["last_number"], self.manifest["total_records"], body)
+        # Manifest goes last so readers never see a shard hash that is not written yet
+        put_json(self.s3, self.bucket, self.manifest_key, body, self.manifest, metadata, compressed=False)
+        self.total_records = self.manifest["total_records"]
+        return metadata
+
+
+def get_store(s3, bucket, dataset_file):
+    if DATASET_LAYOUT == "sharded":
+        return ShardedStore(s3, bucket, DATASET_PREFIX, SHARD_SIZE)
+    return SingleFileStore(s3, bucket, dataset_file)
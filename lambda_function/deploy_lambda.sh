@@ -76,8 +76,8 @@ aws --endpoint-url=$LOCALSTACK_URL_HOST sqs send-message --queue-url $QUEUE_URL
 echo "📦 Packaging Lambda..."
 rm -rf build $ZIP_FILE
 mkdir -p build
-pip install --target ./build requests boto3 -q
-cp lambda_function.py build/
+pip install --target ./build requests boto3 h2 -q
+cp lambda_function.py dataset_store.py h2_transport.py build/
 cd build || exit
 zip -r ../$ZIP_FILE . > /dev/null
 cd ..
@@ -90,6 +90,12 @@ cat > env.json <<EOF
     "Variables": {
         "S3_BUCKET": "$S3_BUCKET",
         "DATASET_FILE": "$DATASET_FILE",
+        "DATASET_LAYOUT": "${DATASET_LAYOUT:-single}",
+        "DATASET_PREFIX": "${DATASET_PREFIX:-dataset/}",
+        "SHARD_SIZE": "${SHARD_SIZE:-500}",
+        "DATASET_COMPRESSION": "${DATASET_COMPRESSION:-none}",
+        "HTTP2": "${HTTP2:-false}",
+        "COLD_START_PROFILE": "${COLD_START_PROFILE:-false}",
         "REGION": "$REGION",
         "LOCALSTACK_URL_CONTAINER": "$LOCALSTACK_URL_CONTAINER",
         "SQS_QUEUE_URL": "$QUEUE_URL"
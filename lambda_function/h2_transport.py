@@ -0,0 +1,118 @@
+import ssl
+import socket
+import logging
+import certifi
+from urllib3.http2 import probe
+
+logger = logging.getLogger()
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.settings
+except ImportError:  # h2 is optional; without it the pooled HTTP/1.1 path is used
+    h2 = None
+
+
+def _tls_context(alpn_protocols):
+    context = ssl.create_default_context(cafile=certifi.where())
+    context.set_alpn_protocols(alpn_protocols)
+    return context
+
+
+def _open_socket(host, port, timeout, alpn_protocols):
+    sock = socket.create_connection((host, port), timeout=timeout)
+    try:
+        return _tls_context(alpn_protocols).wrap_socket(sock, server_hostname=host)
+    except Exception:
+        sock.close()
+        raise
+
+
+def supports_h2(host, port=443, timeout=5):
+    """ALPN probe, cached per origin in urllib3's HTTP/2 probe cache"""
+    if h2 is None:
+        return False
+    cached = probe.acquire_and_get(host, port)
+    if cached is not None:
+        return cached
+    result = False
+    try:
+        with _open_socket(host, port, timeout, ["h2", "http/1.1"]) as sock:
+            result = sock.selected_alpn_protocol() == "h2"
+    except OSError as e:
+        logger.warning(f"HTTP/2 probe of {host}:{port} failed: {e}")
+    finally:
+        probe.set_and_release(host, port, result)
+    logger.info(f"HTTP/2 support for {host}:{port}: {result}")
+    return result
+
+
+class H2Multiplexer:
+    """Sends many GETs as concurrent streams over a single HTTP/2 connection"""
+
+    def __init__(self, host, port=443, timeout=10, max_streams=100):
+        if h2 is None:
+            raise RuntimeError("The h2 package is required for HTTP/2")
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_streams = max_streams
+
+    def get_many(self, paths):
+        """Returns {path: (status, body)}; paths whose stream was reset are left out"""
+        results = {}
+        if not paths:
+            return results
+        sock = _open_socket(self.host, self.port, self.timeout, ["h2"])
+        try:
+            if sock.selected_alpn_protocol() != "h2":
+                raise ConnectionError(f"{self.host} did not negotiate HTTP/2")
+            conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=True))
+            conn.initiate_connection()
+            sock.sendall(conn.data_to_send())
+
+            queue = list(reversed(paths))
+            streams = {}
+            while queue or streams:
+                limit = min(self.max_streams, conn.remote_settings.max_concurrent_streams)
+                while queue and len(streams) < limit:
+                    path = queue.pop()
+                    stream_id = conn.get_next_available_stream_id()
+                    conn.send_headers(stream_id, [
+                        (":method", "GET"),
+                        (":authority", self.host),
+                        (":scheme", "https"),
+                        (":path", path),
+                        ("accept", "application/json"),
+                    ], end_stream=True)
+                    streams[stream_id] = {"path": path, "status": None, "body": bytearray()}
+                sock.sendall(conn.data_to_send())
+
+                data = sock.recv(65536)
+                if not data:
+                    raise ConnectionError("HTTP/2 connection closed by server")
+                for event in conn.receive_data(data):
+                    stream = streams.get(getattr(event, "stream_id", None))
+                    if isinstance(event, h2.events.ResponseReceived) and stream:
+                        stream["status"] = int(dict(event.headers)[b":status"])
+                    elif isinstance(event, h2.events.DataReceived):
+                        if stream:
+                            stream["body"].extend(event.data)
+                        conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded) and stream:
+                        results[stream["path"]] = (stream["status"], bytes(stream["body"]))
+                        del streams[event.stream_id]
+                    elif isinstance(event, h2.events.StreamReset) and stream:
+                        logger.warning(f"HTTP/2 stream for {stream['path']} reset (code {event.error_code})")
+                        del streams[event.stream_id]
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        raise ConnectionError(f"HTTP/2 connection terminated (code {event.error_code})")
+                sock.sendall(conn.data_to_send())
+
+            conn.close_connection()
+            sock.sendall(conn.data_to_send())
+        finally:
+            sock.close()
+        return results
@@ -1,12 +1,39 @@
+import time
+_INIT_STARTED = time.perf_counter()
+
 import os
 import json
-import boto3
 import logging
-import requests
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Log per-module import and client construction times on the first invocation
+COLD_START_PROFILE = os.getenv("COLD_START_PROFILE", "false").lower() == "true"
+COLD_START_TIMES_MS = {}
+_cold_start_logged = False
+
+
+@contextmanager
+def cold_start_timer(name):
+    started = time.perf_counter()
+    yield
+    COLD_START_TIMES_MS[name] = (time.perf_counter() - started) * 1000
+
+
+with cold_start_timer("import boto3"):
+    import boto3
+with cold_start_timer("import requests"):
+    import requests
+    from requests.adapters import HTTPAdapter
+with cold_start_timer("import dataset_store"):
+    from dataset_store import get_store
+with cold_start_timer("import h2_transport"):
+    from h2_transport import H2Multiplexer, supports_h2
+
 BUCKET = os.getenv("S3_BUCKET", "meu-bucket")
 DATASET_FILE = os.getenv("DATASET_FILE", "dataset.json")
 REGION = os.getenv("REGION", "us-east-1")
@@ -16,90 +43,329 @@ SQS_QUEUE_URL = os.getenv("SQS_QUEUE_URL", "")  # SQS queue URL
 # API timeout
 API_TIMEOUT = int(os.getenv("API_TIMEOUT", "10"))
 
-s3 = boto3.client(
-    "s3",
-    endpoint_url=LOCALSTACK_URL,
-    region_name=REGION
-)
+# Caixa API
+API_URL = os.getenv("API_URL", "https://servicebus2.caixa.gov.br/portaldeloterias/api/megasena")
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+HTTP2 = os.getenv("HTTP2", "false").lower() == "true"  # multiplex fetches when the API speaks h2
 
-sqs = boto3.client(
-    "sqs",
-    endpoint_url=LOCALSTACK_URL,
-    region_name=REGION
-)
+# Backfill time budget
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", str(FETCH_WORKERS * 4)))
+SAFETY_MARGIN_MS = int(os.getenv("SAFETY_MARGIN_MS", "10000"))
+SELF_INVOKE = os.getenv("SELF_INVOKE", "false").lower() == "true"
 
-def lambda_handler(event, context):
-    dataset = []
+_clients = {}
+
+
+def aws_client(service):
+    """boto3 clients are built on first use (most invocations never touch SQS) and then reused"""
+    client = _clients.get(service)
+    if client is None:
+        name = f"{service} client"
+        with cold_start_timer(name):
+            client = _clients[service] = boto3.client(
+                service,
+                endpoint_url=LOCALSTACK_URL,
+                region_name=REGION
+            )
+        if COLD_START_PROFILE and _cold_start_logged:
+            logger.info(f"Cold start: {name} built in {COLD_START_TIMES_MS[name]:.1f}ms")
+    return client
+
+
+# Shared keep-alive session, reused by all fetch threads and warm invocations
+http = requests.Session()
+http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS))
+http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS))
+
+
+def contest_record(data):
+    """Convert an API contest payload to a dataset record (None if not drawn)"""
+    if "listaDezenas" not in data or not data["listaDezenas"]:
+        return None
+    numbers = " ".join(data["listaDezenas"])
+    return {
+        "number": int(data["numero"]),
+        "prompt": f"Digits: {data['dataApuracao']} -> Numbers:",
+        "completion": f" {numbers}"
+    }
+
+
+def fetch_contest(concurso_num):
+    """Fetch a single contest and convert it to a dataset record (None if not drawn)"""
+    r = http.get(f"{API_URL}/{concurso_num}", timeout=API_TIMEOUT)
+    r.raise_for_status()
+    return contest_record(r.json())
+
+
+def _fetch_or_log(concurso_num):
     try:
-        logger.info(f"Reading {DATASET_FILE} from bucket {BUCKET}...")
-        response = s3.get_object(Bucket=BUCKET, Key=DATASET_FILE)
-        dataset = json.loads(response["Body"].read())
-        logger.info(f"Dataset loaded. Total records: {len(dataset)}")
-    except s3.exceptions.NoSuchKey:
-        logger.warning(f"{DATASET_FILE} not found. Creating a new dataset...")
-        dataset = []
+        record = fetch_contest(concurso_num)
+        if record is None:
+            logger.warning(f"No result for contest {concurso_num}")
+        return record
     except Exception as e:
-        logger.error(f"Error loading dataset: {e}")
-        return {"dataset": dataset, "total_records": len(dataset)}
+        logger.error(f"Error fetching contest {concurso_num}: {e}")
+        return None
+
+
+def fetch_contests_pooled(concurso_nums):
+    if not concurso_nums:
+        return []
+    workers = max(1, min(FETCH_WORKERS, len(concurso_nums)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_fetch_or_log, concurso_nums))
+    return [r for r in results if r is not None]
 
-    last_number = dataset[0]["number"] if dataset else 0
-    logger.info(f"Last contest in dataset: {last_number}")
 
-    # Last contest from API
+def fetch_contests_h2(concurso_nums):
+    """All contests as streams of one HTTP/2 connection; None if the API does not speak h2"""
+    url = urlsplit(API_URL)
+    port = url.port or 443
+    if url.scheme != "https" or not supports_h2(url.hostname, port, API_TIMEOUT):
+        return None
+    paths = {f"{url.path}/{n}": n for n in concurso_nums}
     try:
-        r = requests.get(
-            "https://servicebus2.caixa.gov.br/portaldeloterias/api/megasena",
-            timeout=API_TIMEOUT
-        )
-        r.raise_for_status()
-        last_concurso_api = int(r.json()["numero"])
-        logger.info(f"Last contest from API: {last_concurso_api}")
+        responses = H2Multiplexer(url.hostname, port, API_TIMEOUT).get_many(list(paths))
     except Exception as e:
-        logger.error(f"Error fetching last contest from API: {e}")
-        last_concurso_api = last_number
+        logger.warning(f"HTTP/2 fetch failed, falling back to HTTP/1.1: {e}")
+        return None
 
-    loop_count = 0
-    max_iterations = 10
-    for concurso_num in range(last_number + 1, last_concurso_api + 1):
-        if loop_count >= max_iterations:
-            break
-        url = f"https://servicebus2.caixa.gov.br/portaldeloterias/api/megasena/{concurso_num}"
+    records = []
+    retry = []
+    for path, concurso_num in paths.items():
+        status, body = responses.get(path, (None, b""))
+        if status != 200:
+            retry.append(concurso_num)
+            continue
         try:
-            r = requests.get(url, timeout=API_TIMEOUT)
-            r.raise_for_status()
-            data = r.json()
-            if "listaDezenas" in data and data["listaDezenas"]:
-                numbers = " ".join(data["listaDezenas"])
-                dataset.insert(0, {
-                    "number": int(data["numero"]),
-                    "prompt": f"Digits: {data['dataApuracao']} -> Numbers:",
-                    "completion": f" {numbers}"
-                })
-                logger.info(f"Contest {concurso_num} added to dataset.")
-            else:
-                logger.warning(f"No result for contest {concurso_num}")
+            record = contest_record(json.loads(body))
         except Exception as e:
-            logger.error(f"Error fetching contest {concurso_num}: {e}")
-        loop_count += 1
+            logger.error(f"Error parsing contest {concurso_num}: {e}")
+            continue
+        if record is None:
+            logger.warning(f"No result for contest {concurso_num}")
+        else:
+            records.append(record)
+    if retry:
+        logger.warning(f"Retrying {len(retry)} contest(s) over HTTP/1.1")
+        records.extend(fetch_contests_pooled(retry))
+    return records
+
+
+def fetch_contests(concurso_nums):
+    """Fetch contests concurrently; returns the records found, in ascending contest order"""
+    if not concurso_nums:
+        return []
+    records = fetch_contests_h2(concurso_nums) if HTTP2 else None
+    if records is None:
+        records = fetch_contests_pooled(concurso_nums)
+    return sorted(records, key=lambda r: r["number"])
+
 
+def save_dataset(store, dataset):
     try:
-        s3.put_object(
-            Bucket=BUCKET,
-            Key=DATASET_FILE,
-            Body=json.dumps(dataset, ensure_ascii=False).encode("utf-8")
-        )
-        logger.info(f"Dataset successfully updated. Total records: {len(dataset)}")
+        store.save(dataset)
+        logger.info(f"Dataset successfully updated. Total records: {store.total_records}")
+        return True
     except Exception as e:
         logger.error(f"Error saving dataset: {e}")
+        return False
+
+
+def has_time_for_batch(context, last_batch_ms):
+    """True while the remaining invocation time covers another batch plus the safety margin"""
+    if context is None:
+        return True
+    remaining_ms = context.get_remaining_time_in_millis()
+    return remaining_ms - SAFETY_MARGIN_MS > last_batch_ms
 
-    if SQS_QUEUE_URL and loop_count > 0:
+
+def reenqueue(context, checkpoint):
+    """Invoke this same function asynchronously to continue the backfill.
+
+    The new invocation resumes from the dataset saved after the last batch,
+    so the payload carries no start point.
+    """
+    try:
+        aws_client("lambda").invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps({}).encode("utf-8")
+        )
+        logger.info(f"Backfill re-enqueued from contest {checkpoint}.")
+        return True
+    except Exception as e:
+        logger.error(f"Error re-enqueuing backfill: {e}")
+        return False
+
+
+def request_training():
+    if not SQS_QUEUE_URL:
+        return
+    try:
+        aws_client("sqs").send_message(
+            QueueUrl=SQS_QUEUE_URL,
+            MessageBody=json.dumps({"action": "train_model"})
+        )
+        logger.info("Message sent to SQS to trigger training.")
+    except Exception as e:
+        logger.error(f"Error sending SQS message: {e}. url: {SQS_QUEUE_URL}")
+
+
+def repair_gaps(store, context):
+    """Refetch only the contests missing from the stored history"""
+    try:
+        records, missing = store.load_gaps()
+    except Exception as e:
+        # The gaps are unknown until the history loads, so say so instead of reporting none
+        logger.error(f"Error loading dataset for repair: {e}")
         try:
-            sqs.send_message(
-                QueueUrl=SQS_QUEUE_URL,
-                MessageBody=json.dumps({"action": "train_model"})
-            )
-            logger.info("Message sent to SQS to trigger training.")
-        except Exception as e:
-            logger.error(f"Error sending SQS message: {e}. url: {SQS_QUEUE_URL}")
+            metadata = store.read_metadata()
+        except Exception:
+            metadata = None
+        return {
+            "gaps_found": None,
+            "gaps_closed": 0,
+            "remaining_gaps": None,
+            "total_records": int(metadata["total-records"]) if metadata else None,
+            "error": f"Error loading dataset: {e}"
+        }
+    logger.info(f"Found {len(missing)} missing contest(s).")
+
+    closed = []
+    error = None
+    last_batch_ms = 0
+    for start in range(0, len(missing), BACKFILL_BATCH_SIZE):
+        if not has_time_for_batch(context, last_batch_ms):
+            logger.info("Time budget reached during repair.")
+            break
+        started = time.monotonic()
+        fetched = fetch_contests(missing[start:start + BACKFILL_BATCH_SIZE])
+        if fetched:
+            records.extend(fetched)
+            records.sort(key=lambda r: r["number"], reverse=True)
+            if not save_dataset(store, records):
+                error = "Error saving dataset"
+                break
+            closed.extend(r["number"] for r in fetched)
+        last_batch_ms = (time.monotonic() - started) * 1000
+
+    if closed:
+        request_training()
+
+    # Only what reached the store counts as repaired
+    repaired = set(closed)
+    remaining = [n for n in missing if n not in repaired]
+    logger.info(f"Repair closed {len(closed)} of {len(missing)} gap(s).")
+    result = {
+        "gaps_found": len(missing),
+        "gaps_closed": len(closed),
+        "remaining_gaps": remaining,
+        "total_records": store.total_records
+    }
+    if error:
+        result["error"] = error
+    return result
+
+
+def fetch_last_contest_number():
+    r = http.get(API_URL, timeout=API_TIMEOUT)
+    r.raise_for_status()
+    return int(r.json()["numero"])
+
+
+def log_cold_start():
+    global _cold_start_logged
+    if _cold_start_logged:
+        return
+    _cold_start_logged = True
+    timings = ", ".join(f"{name}={ms:.1f}ms" for name, ms in sorted(COLD_START_TIMES_MS.items(), key=lambda t: -t[1]))
+    logger.info(f"Cold start: module init {INIT_MS:.1f}ms | {timings}")
+
+
+def lambda_handler(event, context):
+    store = get_store(aws_client("s3"), BUCKET, DATASET_FILE)
+    if COLD_START_PROFILE:
+        log_cold_start()
+
+    if (event or {}).get("mode") == "repair":
+        return repair_gaps(store, context)
+
+    # Fast path: compare the stored metadata with the API before downloading anything
+    metadata = store.read_metadata()
+    try:
+        last_concurso_api = fetch_last_contest_number()
+        logger.info(f"Last contest from API: {last_concurso_api}")
+    except Exception as e:
+        logger.error(f"Error fetching last contest from API: {e}")
+        last_concurso_api = None
+
+    if metadata is not None:
+        stored_number = int(metadata["last-number"])
+        if last_concurso_api is None or stored_number >= last_concurso_api:
+            logger.info(f"Dataset already up to date at contest {stored_number}.")
+            return {
+                "dataset": [],
+                "total_records": int(metadata.get("total-records", 0)),
+                "checkpoint": stored_number,
+                "more_pending": False
+            }
+
+    dataset = []
+    try:
+        dataset = store.load()
+    except Exception as e:
+        logger.error(f"Error loading dataset: {e}")
+        return {"dataset": dataset, "total_records": len(dataset)}
+
+    last_number = dataset[0]["number"] if dataset else 0
+    logger.info(f"Last contest in dataset: {last_number}")
+
+    if last_concurso_api is None:
+        last_concurso_api = last_number
+
+    # Fetch in batches until the API is caught up or the time budget runs out.
+    # Every batch is checkpointed, so a timeout never loses written contests.
+    next_number = last_number + 1
+    added = 0
+    last_batch_ms = 0
+    checkpoint = last_number
+    while next_number <= last_concurso_api:
+        if not has_time_for_batch(context, last_batch_ms):
+            logger.info(f"Time budget reached before contest {next_number}.")
+            break
+        batch_end = min(next_number + BACKFILL_BATCH_SIZE, last_concurso_api + 1)
+        started = time.monotonic()
+        records = fetch_contests(list(range(next_number, batch_end)))
+        for record in records:
+            # dataset is kept newest first
+            dataset.insert(0, record)
+            logger.info(f"Contest {record['number']} added to dataset.")
+        if records:
+            if not save_dataset(store, dataset):
+                break
+            added += len(records)
+            checkpoint = dataset[0]["number"]
+        next_number = batch_end
+        last_batch_ms = (time.monotonic() - started) * 1000
+
+    more_pending = next_number <= last_concurso_api
+    reenqueued = False
+    if more_pending:
+        logger.info(f"Backfill incomplete: checkpoint {checkpoint}, API at {last_concurso_api}.")
+        if SELF_INVOKE and context is not None:
+            reenqueued = reenqueue(context, checkpoint)
+
+    # Training is triggered once, by the invocation that finishes the backfill
+    if added > 0 and not reenqueued:
+        request_training()
+
+    return {
+        "dataset": dataset[:5],
+        "total_records": store.total_records,
+        "checkpoint": checkpoint,
+        "more_pending": more_pending
+    }
+
 
-    return {"dataset": dataset[:5], "total_records": len(dataset)}
+INIT_MS = (time.perf_counter() - _INIT_STARTED) * 1000
@@ -0,0 +1,80 @@
+"""Cold-start regression benchmark for the Lambda handler module.
+
+Imports lambda_function in fresh interpreters (python -X importtime), reports
+the median import time and the heaviest top-level modules, and exits with
+status 1 when the median goes over the budget.
+
+    python tools/bench_cold_start.py --runs 5 --budget-ms 1000
+"""
+import os
+import re
+import sys
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+CHILD = (
+    "import time; started = time.perf_counter(); import lambda_function; "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def run_child(python):
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", CHILD],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True
+    )
+    import_ms = float(result.stdout.strip().splitlines()[-1])
+    # importtime lists children (two more spaces of indent) before their parent,
+    # so the modules seen since the previous top-level line belong to the next one
+    modules = {}
+    children = {}
+    for line in result.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        depth, name, cumulative_ms = len(m.group(3)), m.group(4), int(m.group(2)) / 1000
+        if depth == 3:
+            children[name] = cumulative_ms
+        elif depth == 1:
+            if name == "lambda_function":
+                modules = dict(children, lambda_function=cumulative_ms)
+            children = {}
+    return import_ms, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("COLD_START_BUDGET_MS", "1000")))
+    parser.add_argument("--top", type=int, default=10, help="Heaviest modules imported by the handler to list")
+    parser.add_argument("--python", default=sys.executable)
+    args = parser.parse_args()
+
+    run_child(args.python)  # warm the bytecode cache so runs compare like for like
+    timings = []
+    per_module = {}
+    for _ in range(args.runs):
+        import_ms, modules = run_child(args.python)
+        timings.append(import_ms)
+        for name, ms in modules.items():
+            per_module.setdefault(name, []).append(ms)
+
+    median = statistics.median(timings)
+    print(f"lambda_function import: median={median:.1f}ms min={min(timings):.1f}ms max={max(timings):.1f}ms "
+          f"({args.runs} runs, budget {args.budget_ms:.0f}ms)")
+    heaviest = sorted(per_module.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+    for name, values in heaviest:
+        print(f"  {statistics.median(values):8.1f}ms  {name}")
+
+    if median > args.budget_ms:
+        print(f"FAIL: cold-start import {median:.1f}ms is over the {args.budget_ms:.0f}ms budget")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
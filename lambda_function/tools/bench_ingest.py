@@ -0,0 +1,124 @@
+"""Ingestion benchmark: drives lambda_handler against the local Caixa API stub
+and in-memory S3/SQS, without touching servicebus2.caixa.gov.br or LocalStack.
+
+    python tools/bench_ingest.py --missing 300 --latency-ms 80 --jitter-ms 40 --runs 3
+
+Each run seeds the bucket with dataset.json minus its newest --missing
+contests, then invokes the handler (following more_pending the way
+SELF_INVOKE would) until the backfill is complete.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from caixa_stub import start_stub  # noqa: E402
+from local_aws import MemoryS3, MemorySQS, MemoryLambda  # noqa: E402
+
+
+class FakeContext:
+    invoked_function_arn = "arn:aws:lambda:us-east-1:000000000000:function:bench"
+
+    def __init__(self, timeout_ms):
+        self.deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_once(lf, dataset, missing, timeout_ms):
+    from dataset_store import get_store
+
+    s3 = MemoryS3()
+    lf._clients.update(s3=s3, sqs=MemorySQS(), **{"lambda": MemoryLambda()})
+    get_store(s3, lf.BUCKET, lf.DATASET_FILE).save(dataset[missing:])
+
+    latencies = []
+    fetch_contest = lf.fetch_contest
+
+    def timed_fetch(concurso_num):
+        started = time.perf_counter()
+        try:
+            return fetch_contest(concurso_num)
+        finally:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    lf.fetch_contest = timed_fetch
+    invocations = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            invocations += 1
+            result = lf.lambda_handler({}, FakeContext(timeout_ms))
+            if not result.get("more_pending"):
+                break
+    finally:
+        lf.fetch_contest = fetch_contest
+    total_s = time.perf_counter() - started
+
+    return {
+        "invocations": invocations,
+        "contests": result["total_records"] - (len(dataset) - missing),
+        "total_s": total_s,
+        "latencies": latencies,
+        "s3_calls": dict(s3.calls),
+        "s3_bytes_in": s3.bytes_in,
+        "s3_bytes_out": s3.bytes_out
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=os.path.join(BASE_DIR, "dataset.json"))
+    parser.add_argument("--missing", type=int, default=100, help="Newest contests removed before each run")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout-ms", type=int, default=60000, help="Simulated Lambda timeout per invocation")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0)
+    args = parser.parse_args()
+
+    server = start_stub(
+        dataset_path=args.dataset, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit=args.rate_limit
+    )
+    # Read by lambda_function at import time
+    os.environ["API_URL"] = server.api_url
+    os.environ.setdefault("SQS_QUEUE_URL", "local-queue")
+    import lambda_function as lf
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        dataset = json.load(f)
+
+    print(f"Stub: {server.api_url} | missing={args.missing} latency={args.latency_ms}ms "
+          f"jitter={args.jitter_ms}ms errors={args.error_rate:.0%} workers={lf.FETCH_WORKERS}")
+    for run in range(1, args.runs + 1):
+        r = run_once(lf, dataset, args.missing, args.timeout_ms)
+        rate = r["contests"] / r["total_s"] if r["total_s"] else 0.0
+        print(
+            f"run {run}: {r['contests']} contests in {r['total_s']:.2f}s "
+            f"({rate:.1f} contests/s, {r['invocations']} invocation(s)) | "
+            f"fetch p50={percentile(r['latencies'], 50):.1f}ms p99={percentile(r['latencies'], 99):.1f}ms "
+            f"mean={statistics.fmean(r['latencies']) if r['latencies'] else 0:.1f}ms | "
+            f"S3 {r['s3_calls']} in={r['s3_bytes_in']}B out={r['s3_bytes_out']}B"
+        )
+    print(f"Stub stats: {server.stats}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Local stand-in for the Caixa Mega-Sena API.
+
+Serves /portaldeloterias/api/megasena and /portaldeloterias/api/megasena/{n}
+from dataset.json, with configurable latency, error rate and rate limit.
+
+    python tools/caixa_stub.py --port 8080 --latency-ms 80 --error-rate 0.02
+    API_URL=http://localhost:8080/portaldeloterias/api/megasena python ...
+"""
+import os
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_PATH = "/portaldeloterias/api/megasena"
+
+
+def load_contests(dataset_path):
+    """Convert dataset records back into the API's JSON shape, keyed by contest number"""
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        dataset = json.load(f)
+    contests = {}
+    for entry in dataset:
+        date = re.search(r"(\d{1,2})\D(\d{1,2})\D(\d{4})", entry["prompt"])
+        contests[entry["number"]] = {
+            "numero": entry["number"],
+            "dataApuracao": "/".join(date.groups()),
+            "listaDezenas": [f"{int(n):02d}" for n in entry["completion"].split()]
+        }
+    return contests
+
+
+class RateLimiter:
+    """Token bucket; rate <= 0 disables it"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, contests, latest=None, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit=0):
+        super().__init__(address, StubHandler)
+        self.contests = contests
+        self.latest = latest or max(contests)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(rate_limit)
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self.stats_lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_GET(self):
+        server = self.server
+        server.count("requests")
+        if not server.limiter.allow():
+            server.count("rate_limited")
+            return self._send(429, {"message": "Too Many Requests"})
+
+        delay_ms = server.latency_ms + random.uniform(-server.jitter_ms, server.jitter_ms)
+        time.sleep(max(0.0, delay_ms) / 1000)
+        if random.random() < server.error_rate:
+            server.count("errors")
+            return self._send(500, {"message": "Internal Server Error"})
+
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == API_PATH:
+            return self._send(200, server.contests[server.latest])
+        m = re.fullmatch(rf"{API_PATH}/(\d+)", path)
+        if m and int(m.group(1)) in server.contests and int(m.group(1)) <= server.latest:
+            return self._send(200, server.contests[int(m.group(1))])
+        return self._send(404, {"message": "Not Found"})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(host="127.0.0.1", port=0, dataset_path=None, **options):
+    """Start the stub on a background thread and return the server"""
+    contests = load_contests(dataset_path or os.path.join(BASE_DIR, "dataset.json"))
+    server = StubServer((host, port), contests, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--dataset", default=os.path.join(BASE_DIR, "dataset.json"))
+    parser.add_argument("--latest", type=int, default=None, help="Newest contest reported by the API")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Requests per second before answering 429")
+    args = parser.parse_args()
+
+    server = start_stub(
+        args.host, args.port, args.dataset,
+        latest=args.latest, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit=args.rate_limit
+    )
+    print(f"Caixa API stub listening on {server.api_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
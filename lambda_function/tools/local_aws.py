@@ -0,0 +1,79 @@
+"""In-memory stand-ins for the S3, SQS and Lambda clients used by lambda_function.
+
+Only the calls the handler makes are implemented, with the same error shapes
+as boto3 (ClientError with a NoSuchKey / 404 code, 304 on a matching IfNoneMatch).
+"""
+import hashlib
+import threading
+from botocore.exceptions import ClientError
+
+
+class _Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+class MemoryS3:
+    class exceptions:
+        NoSuchKey = ClientError
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = {"head_object": 0, "get_object": 0, "put_object": 0}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.lock = threading.Lock()
+
+    def _object(self, op, Key):
+        with self.lock:
+            self.calls[op] += 1
+        if Key not in self.objects:
+            code = "404" if op == "head_object" else "NoSuchKey"
+            raise ClientError({"Error": {"Code": code, "Message": "Not Found"}}, op)
+        return self.objects[Key]
+
+    def head_object(self, Bucket, Key):
+        obj = self._object("head_object", Key)
+        return {k: v for k, v in obj.items() if k != "Body"}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        obj = self._object("get_object", Key)
+        if IfNoneMatch is not None and IfNoneMatch == obj["ETag"]:
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+        self.bytes_out += len(obj["Body"])
+        return dict(obj, Body=_Body(obj["Body"]))
+
+    def put_object(self, Bucket, Key, Body, Metadata=None, **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        with self.lock:
+            self.calls["put_object"] += 1
+            self.bytes_in += len(data)
+        self.objects[Key] = dict(
+            kwargs,
+            Body=data,
+            Metadata=dict(Metadata or {}),
+            ETag=f'"{hashlib.md5(data).hexdigest()}"',
+            ContentLength=len(data)
+        )
+        return {"ETag": self.objects[Key]["ETag"]}
+
+
+class MemorySQS:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self.messages.append({"QueueUrl": QueueUrl, "Body": MessageBody})
+        return {"MessageId": str(len(self.messages))}
+
+
+class MemoryLambda:
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.invocations.append({"FunctionName": FunctionName, "Payload": Payload})
+        return {"StatusCode": 202}
@@ -1,5 +1,7 @@
 import os
+import json
 import boto3
+from dataset_store import get_store
 
 S3_BUCKET = os.getenv("S3_BUCKET", "meu-bucket")
 DATASET_FILE = os.getenv("DATASET_FILE", "dataset.json")
@@ -12,8 +14,11 @@ s3 = boto3.client(
     region_name=REGION
 )
 
-# Sempre sobrescreve o dataset
-with open(DATASET_FILE, "rb") as f:
-    s3.put_object(Bucket=S3_BUCKET, Key=DATASET_FILE, Body=f)
+with open(DATASET_FILE, "r", encoding="utf-8") as f:
+    dataset = json.load(f)
+
+# Sempre sobrescreve o dataset, no layout configurado (DATASET_LAYOUT),
+# com os mesmos metadados gravados pela Lambda
+get_store(s3, S3_BUCKET, DATASET_FILE).save(dataset)
 
 print(f"{DATASET_FILE} enviado com sucesso para {S3_BUCKET}.")